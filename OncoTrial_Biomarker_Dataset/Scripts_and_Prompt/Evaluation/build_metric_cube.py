@@ -0,0 +1,131 @@
+import glob
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.eval_core import Interner, TrialSets, confusion_by_label
+from common.json_stream import iter_trials
+from common.mapping_modes import MappingModes
+from common.metric_cube import MetricCube, SIDES
+from common.target_matcher import is_target, target_families
+
+### =============================
+### CONFIG
+### =============================
+GS_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
+# every "<model>_<n>shot.json" extraction run
+LLM_FILES = sorted(glob.glob("/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/*_*shot.json"))
+MAP_DIR = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation"
+STRICT_MAP_FILE = os.path.join(MAP_DIR, "mapped_strict.json")
+LENIENT_MAP_FILE = os.path.join(MAP_DIR, "mapped_lenient.json")
+# the run mapped_strict.json / mapped_lenient.json were built from; any other
+# run needs its own mapped_strict_<run>.json / mapped_lenient_<run>.json, or
+# gets no Strict / Lenient cells
+MAPPED_RUN = "gpt-4.0-turbo_1shot"
+ONTOLOGY_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/biomarker_aggregate.json"
+
+OUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Evaluation/metric_cube.npz"
+
+
+### =============================
+### HELPER FUNCTIONS
+### =============================
+def flatten(lst):
+    out = []
+    for x in lst:
+        if isinstance(x, list):
+            out.extend(x)
+        else:
+            out.append(x)
+    return out
+
+def run_name(path):
+    """gpt-4.0-turbo_1shot.json -> ("gpt-4.0-turbo", 1); n_shot -1 if not in the name."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    m = re.match(r"(.+)_(\d+)[_-]?shot$", stem)
+    return (m.group(1), int(m.group(2))) if m else (stem, -1)
+
+def run_modes(llm_file):
+    """{mode: filter} for one run: Strict / Lenient only with that run's mapping files."""
+    stem = os.path.splitext(os.path.basename(llm_file))[0]
+    strict_file = os.path.join(MAP_DIR, f"mapped_strict_{stem}.json")
+    lenient_file = os.path.join(MAP_DIR, f"mapped_lenient_{stem}.json")
+
+    modes = {"LLM-only": BASE_MODES.llm_only}
+    if os.path.exists(strict_file) and os.path.exists(lenient_file):
+        with open(strict_file) as f:
+            strict_map = json.load(f)
+        with open(lenient_file) as f:
+            lenient_map = json.load(f)
+        run_maps = MappingModes(strict_map, lenient_map, [])
+        modes.update({"Strict": run_maps.strict, "Lenient": run_maps.lenient})
+    elif stem == MAPPED_RUN:
+        modes.update({"Strict": BASE_MODES.strict, "Lenient": BASE_MODES.lenient})
+    else:
+        print(f"No mapping files for {stem}; skipping its Strict / Lenient cells")
+    modes["Oracle"] = BASE_MODES.oracle
+    return modes
+
+def side_terms(item, side):
+    keys = ["inclusion_biomarker", "exclusion_biomarker"] if side == "any" else [f"{side}_biomarker"]
+    terms = []
+    for key in keys:
+        terms += flatten(item.get(key, []))
+    return [x.lower() for x in terms if is_target(x)]
+
+
+### =============================
+### LOAD DATA
+### =============================
+# oracle vocabulary + the maps of MAPPED_RUN
+BASE_MODES = MappingModes.load(STRICT_MAP_FILE, LENIENT_MAP_FILE, ONTOLOGY_FILE)
+
+
+### =============================
+### PER-TERM OUTCOMES → CUBE
+### =============================
+terms = Interner()
+family_names = []
+families = []          # family code per interned term id
+
+def family_labels():
+    """Extend `families` to every term interned so far."""
+    for term in terms.strings[len(families):]:
+        name = "+".join(target_families(term))
+        if name not in family_names:
+            family_names.append(name)
+        families.append(family_names.index(name))
+    return families
+
+records = []
+for llm_file in LLM_FILES:
+    model, n_shot = run_name(llm_file)
+    llm_dict = dict(iter_trials(llm_file))
+    MODES = run_modes(llm_file)
+
+    for side in SIDES:
+        gs_rows = []
+        pred_rows = {mode: [] for mode in MODES}
+        for nct_id, item in iter_trials(GS_FILE):
+            gs_bm = side_terms(item, side)
+            llm_bm = side_terms(llm_dict.get(nct_id, {}), side)
+            gs_rows.append(gs_bm)
+            for mode, keep in MODES.items():
+                pred_rows[mode].append(keep(gs_bm, llm_bm))
+
+        gs_sets = TrialSets.from_lists(gs_rows, terms)
+        for mode in MODES:
+            pred_sets = TrialSets.from_lists(pred_rows[mode], terms)
+            tp, fp, fn = confusion_by_label(gs_sets, pred_sets, family_labels(), len(family_names))
+            for f, family in enumerate(family_names):
+                if tp[f] or fp[f] or fn[f]:
+                    records.append((model, n_shot, mode, family, side, tp[f], fp[f], fn[f]))
+
+cube = MetricCube.from_records(records)
+cube.save(OUT_FILE)
+print(f"Saved metric cube ({len(cube)} cells, {len(LLM_FILES)} runs) →", OUT_FILE)
+
+for (model, n_shot, mode), s in cube.rollup(["model", "n_shot", "mode"]).items():
+    print(f"{model} {n_shot}-shot {mode:<10} P={s['Precision']:.3f}, R={s['Recall']:.3f}, F1={s['F1']:.3f}")
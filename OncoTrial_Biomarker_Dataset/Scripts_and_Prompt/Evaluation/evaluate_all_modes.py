@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.eval_core import Interner, TrialSets, confusion, scores
+from common.json_stream import iter_trials
+from common.mapping_modes import MappingModes
+from common.significance import bootstrap_ci, paired_permutation
+from common.target_matcher import is_target
+
+### =============================
+### CONFIG
+### =============================
+GS_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
+LLM_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.json"
+STRICT_MAP_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_strict.json"
+LENIENT_MAP_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_lenient.json"
+ONTOLOGY_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/biomarker_aggregate.json"
+
+OUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Evaluation/all_modes_vs_gs.json"
+
+
+### =============================
+### HELPER FUNCTIONS
+### =============================
+def flatten(lst):
+    out = []
+    for x in lst:
+        if isinstance(x, list):
+            out.extend(x)
+        else:
+            out.append(x)
+    return out
+
+
+### =============================
+### LOAD DATA (once for every mode)
+### =============================
+
+llm_dict = dict(iter_trials(LLM_FILE))
+
+# one filter per mode (common/mapping_modes.py)
+MODES = MappingModes.load(STRICT_MAP_FILE, LENIENT_MAP_FILE, ONTOLOGY_FILE).filters()
+
+
+### =============================
+### MAIN LOOP (single pass)
+### =============================
+trial_ids = []
+gs_rows = []
+pred_rows = {mode: [] for mode in MODES}
+
+for nct_id, item in iter_trials(GS_FILE):
+
+    gs_bm = flatten(item.get("inclusion_biomarker", [])) + \
+            flatten(item.get("exclusion_biomarker", []))
+    gs_bm = [x.lower() for x in gs_bm if is_target(x)]
+
+    llm_item = llm_dict.get(nct_id, {})
+    llm_bm = flatten(llm_item.get("inclusion_biomarker", [])) + \
+             flatten(llm_item.get("exclusion_biomarker", []))
+    llm_bm = [x.lower() for x in llm_bm if is_target(x)]
+
+    trial_ids.append(nct_id)
+    gs_rows.append(gs_bm)
+    for mode, keep in MODES.items():
+        pred_rows[mode].append(keep(gs_bm, llm_bm))
+
+
+### =============================
+### METRICS
+### =============================
+terms = Interner()
+gs_sets = TrialSets.from_lists(gs_rows, terms)
+
+summary = {}
+counts = {}
+for mode in MODES:
+    pred_sets = TrialSets.from_lists(pred_rows[mode], terms)
+    tp, fp, fn = counts[mode] = confusion(gs_sets, pred_sets)
+
+    summary[mode] = scores(tp, fp, fn)
+    summary[mode]["CI"] = bootstrap_ci(tp, fp, fn)
+    summary[mode]["per_trial"] = {
+        nct_id: {
+            "gs": gs_sets.terms(i),
+            "pred": pred_sets.terms(i),
+            "TP": int(tp[i]),
+            "FP": int(fp[i]),
+            "FN": int(fn[i])
+        }
+        for i, nct_id in enumerate(trial_ids)
+    }
+
+# paired permutation tests (same trials, same seed) for every pair of modes
+comparisons = {
+    f"{a} vs {b}": paired_permutation(counts[a], counts[b])
+    for a, b in combinations(MODES, 2)
+}
+
+json.dump({**summary, "Comparisons": comparisons}, open(OUT_FILE, "w"), indent=2)
+print("Saved evaluation →", OUT_FILE)
+for mode, s in summary.items():
+    lo, hi = s["CI"].get("F1", (0, 0))
+    print(f"{mode:<10} P={s['Precision']:.3f}, R={s['Recall']:.3f}, F1={s['F1']:.3f} "
+          f"(95% CI {lo:.3f}–{hi:.3f})")
+for name, test in comparisons.items():
+    print(f"{name:<22} ΔF1={test['F1_difference']:+.3f}, p={test['p_value']:.4f}")
@@ -1,40 +1,33 @@
 import json
+import os
+import sys
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.eval_core import Interner, TrialSets, confusion, scores
+from common.json_stream import iter_trials
+from common.significance import bootstrap_ci
+from common.ontology_hierarchy import OntologyHierarchy
+from common.target_matcher import is_target
+
 ### =============================
 ### CONFIG
 ### =============================
 GS_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
 LLM_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.json"
 MAP_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_lenient.json"
+# gold-standard terms mapped by Strict_Lenient_mapping.py (Hierarchical score only)
+GOLD_MAP_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_gold_lenient.json"
 
 OUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Evaluation/lenient_vs_gs.json"
 
-### TARGET BIOMARKERS 
-TARGET_BIOMARKERS = [
-    "brca", "brca1", "brca2", "gbrca",
-    "germline brca", "somatic brca",
-    "brca mutation", "pathogenic brca",
-    "brca-deficient", "brca deficiency",
-    "brca loss", "brca1/2", "brca vus",
-    "variant of uncertain significance",
-    "her2", "erbb2", "her2+", "her2 positive",
-    "her2 positive expression", "her2-positive",
-    "her2-expressing", "her2 overexpression",
-    "her2 ihc", "ihc 3+", "her2 ihc 1+ or above",
-    "her2 amplification", "erbb2 amplification",
-    "her2 amplification (ngs)",
-    "her2 amplification (ish her2/cep17 ≥ 2.0)",
-    "her2 mutation", "her2 mutant", "erbb2 mutant",
-    "her2 l755a", "her2 l755s", "her2 v777l",
-    "her2 v659e", "her2 s310f",
-    "exon 20 insertion", "her2 exon 20 insertion mutation",
-    "her2 exon 20 insertion (insyvma)",
-    "her2 exon 20 insertion (insgsp)",
-    "her2 exon 20 insertion (instgt)",
-    "insyvma", "insgsp", "instgt",
-    "her2-targeted", "anti-her2"
-]
+# Optional hierarchy indexes (common/ontology_hierarchy.py); when present, an
+# extra "Hierarchical" score also credits predictions whose mapped concept is
+# the gold term's concept or its ancestor / descendant (parent-level mapping)
+HIERARCHY_FILES = {
+    "NCIt": "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/ncit_hierarchy.npz",
+    "UMLS": "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/umls_hierarchy.npz"
+}
 
 ### =============================
 ### Helpers
@@ -48,35 +41,58 @@ def flatten(lst):
             out.append(x)
     return out
 
-def is_target(term):
-    t = term.lower()
-    return any(key in t for key in TARGET_BIOMARKERS)
+def concept_of(term, term_mapping):
+    entry = term_mapping.get(term)
+    if not entry or not entry.get("code"):
+        return None
+    return entry.get("ontology"), entry["code"]
+
+def hierarchical_matches(gold_left, pred_left):
+    """(gold, predicted) pairs whose mapped concepts are hierarchy-related."""
+    pairs, used = [], set()
+    for g in sorted(gold_left):
+        cg = concept_of(g, gold_mapping)
+        if cg is None or cg[0] not in hierarchies:
+            continue
+        for p in sorted(pred_left - used):
+            cp = concept_of(p, mapping)
+            if cp is not None and cp[0] == cg[0] and hierarchies[cg[0]].is_related(cp[1], cg[1]):
+                pairs.append((g, p))
+                used.add(p)
+                break
+    return pairs
 
 ### =============================
 ### Load files
 ### =============================
-gs = json.load(open(GS_FILE))
-llm = json.load(open(LLM_FILE))
 mapping = json.load(open(MAP_FILE))
+gold_mapping = json.load(open(GOLD_MAP_FILE)) if os.path.exists(GOLD_MAP_FILE) else {}
 
-llm_dict = {x["nct_id"]: x for x in llm}
+llm_dict = dict(iter_trials(LLM_FILE))
 
-### =============================
-### Evaluation counters
-### =============================
-TP = FP = FN = 0
-per_trial_result = {}
+hierarchies = {
+    name: OntologyHierarchy.load(path)
+    for name, path in HIERARCHY_FILES.items() if os.path.exists(path)
+}
+# the Hierarchical score needs concepts for the gold terms too
+if hierarchies and not gold_mapping:
+    print("No gold-standard mapping", GOLD_MAP_FILE, "(run Strict_Lenient_mapping.py); "
+          "skipping the Hierarchical score")
+    hierarchies = {}
 
 ### =============================
 ### Main evaluation loop
 ### =============================
-for nct_id, item in gs.items():
+trial_ids = []
+gs_rows = []
+mapped_rows = []
+
+for nct_id, item in iter_trials(GS_FILE):
 
     # GS biomarkers
     gs_bm = flatten(item.get("inclusion_biomarker", [])) + \
             flatten(item.get("exclusion_biomarker", []))
     gs_bm = [x.lower() for x in gs_bm if is_target(x)]
-    gs_set = set(gs_bm)
 
     # LLM extraction
     llm_item = llm_dict.get(nct_id, {})
@@ -85,44 +101,62 @@ for nct_id, item in gs.items():
     extracted = [x.lower() for x in extracted if is_target(x)]
 
     # Mapping results
-    mapped_set = set()
+    mapped = []
     for term in extracted:
         mapped_entry = mapping.get(term)
         if mapped_entry and mapped_entry.get("mapped", True) is not None:
-            mapped_set.add(term)
+            mapped.append(term)
 
-    # Compute metrics
-    tp = len(gs_set & mapped_set)
-    fp = len(mapped_set - gs_set)
-    fn = len(gs_set - mapped_set)
+    trial_ids.append(nct_id)
+    gs_rows.append(gs_bm)
+    mapped_rows.append(mapped)
 
-    TP += tp
-    FP += fp
-    FN += fn
+### =============================
+### Final metrics
+### =============================
+terms = Interner()
+gs_sets = TrialSets.from_lists(gs_rows, terms)
+mapped_sets = TrialSets.from_lists(mapped_rows, terms)
+tp, fp, fn = confusion(gs_sets, mapped_sets)
 
+per_trial_result = {}
+H_TP = H_FP = H_FN = 0
+for i, nct_id in enumerate(trial_ids):
+    gs_terms, mapped_terms = gs_sets.terms(i), mapped_sets.terms(i)
     per_trial_result[nct_id] = {
-        "GS": list(gs_set),
-        "LLM+Mapped": list(mapped_set),
-        "TP": tp, "FP": fp, "FN": fn
+        "GS": gs_terms,
+        "LLM+Mapped": mapped_terms,
+        "TP": int(tp[i]), "FP": int(fp[i]), "FN": int(fn[i])
     }
 
-### =============================
-### Final metrics
-### =============================
-precision = TP / (TP + FP) if TP + FP else 0
-recall = TP / (TP + FN) if TP + FN else 0
-f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
-
-summary = {
-    "TP": TP,
-    "FP": FP,
-    "FN": FN,
-    "Precision": precision,
-    "Recall": recall,
-    "F1": f1,
-    "per_trial": per_trial_result
-}
+    # hierarchy credit only looks at the (few) trials with leftovers on both sides
+    if hierarchies:
+        pairs = []
+        if fp[i] and fn[i]:
+            gs_set, mapped_set = set(gs_terms), set(mapped_terms)
+            pairs = hierarchical_matches(gs_set - mapped_set, mapped_set - gs_set)
+        H_TP += int(tp[i]) + len(pairs)
+        H_FP += int(fp[i]) - len(pairs)
+        H_FN += int(fn[i]) - len(pairs)
+        per_trial_result[nct_id]["hierarchical_matches"] = pairs
+
+summary = scores(tp, fp, fn)
+summary["CI"] = bootstrap_ci(tp, fp, fn)
+summary["per_trial"] = per_trial_result
+precision, recall, f1 = summary["Precision"], summary["Recall"], summary["F1"]
+
+if hierarchies:
+    h_precision = H_TP / (H_TP + H_FP) if H_TP + H_FP else 0
+    h_recall = H_TP / (H_TP + H_FN) if H_TP + H_FN else 0
+    h_f1 = 2 * h_precision * h_recall / (h_precision + h_recall) if h_precision + h_recall else 0
+    summary["Hierarchical"] = {
+        "TP": H_TP, "FP": H_FP, "FN": H_FN,
+        "Precision": h_precision, "Recall": h_recall, "F1": h_f1
+    }
 
 json.dump(summary, open(OUT_FILE, "w"), indent=2)
 print("Saved lenient vs GS evaluation →", OUT_FILE)
+if hierarchies:
+    print(f"Hierarchical ({', '.join(hierarchies)}): "
+          f"P={h_precision:.3f}, R={h_recall:.3f}, F1={h_f1:.3f}")
 print(f"P={precision:.3f}, R={recall:.3f}, F1={f1:.3f}")
\ No newline at end of file
@@ -1,5 +1,12 @@
 import json
+import os
 import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.fuzzy_index import TrigramIndex
+from common.json_stream import iter_trials
+from common.target_matcher import TargetMatcher
 
 # ---------- paths ----------
 GS_PATH = "Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
@@ -17,23 +24,21 @@ def normalize(text: str) -> str:
     return text.strip()
 
 
+# Oracle scope is the gene symbols only (narrower than TARGET_BIOMARKERS)
+ORACLE_SCOPE = TargetMatcher({
+    "HER2": ["her2", "erbb2"],
+    "BRCA": ["brca1", "brca2"]
+})
+
+
 def is_her2_brca(bm: str) -> bool:
     """
     Restrict oracle evaluation to HER2 / BRCA scope
     """
-    bm = bm.lower()
-    return (
-        "her2" in bm
-        or "erbb2" in bm
-        or "brca1" in bm
-        or "brca2" in bm
-    )
+    return ORACLE_SCOPE.is_target(bm)
 
 
 # ---------- load data ----------
-with open(GS_PATH) as f:
-    gs_data = json.load(f)
-
 with open(ONTOLOGY_PATH) as f:
     ontology_dict = json.load(f)
 
@@ -41,6 +46,9 @@ with open(ONTOLOGY_PATH) as f:
 ontology_terms = list(ontology_dict.keys())
 ontology_norm = [normalize(t) for t in ontology_terms]
 
+# trigram index: substring candidates without comparing against every term
+ontology_index = TrigramIndex(ontology_norm)
+
 
 # ---------- oracle mapping ----------
 results = {
@@ -50,7 +58,7 @@ results = {
     "details": []
 }
 
-for trial_id, trial in gs_data.items():
+for trial_id, trial in iter_trials(GS_PATH):
 
     # collect GS biomarkers (inclusion + exclusion)
     gs_biomarkers = []
@@ -70,11 +78,10 @@ for trial_id, trial in gs_data.items():
         results["total_biomarkers"] += 1
         bm_norm = normalize(bm)
 
-        # lenient oracle mapping
+        # lenient oracle mapping (bm_norm in o_norm or o_norm in bm_norm)
         matched_terms = [
             ontology_terms[i]
-            for i, o_norm in enumerate(ontology_norm)
-            if bm_norm in o_norm or o_norm in bm_norm
+            for i in ontology_index.substring_matches(bm_norm)
         ]
 
         if matched_terms:
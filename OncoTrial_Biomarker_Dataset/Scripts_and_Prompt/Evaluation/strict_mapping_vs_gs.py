@@ -1,6 +1,14 @@
 import json
+import os
+import sys
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.eval_core import Interner, TrialSets, confusion, scores
+from common.json_stream import iter_trials
+from common.significance import bootstrap_ci
+from common.target_matcher import is_target
+
 ### =============================
 ### CONFIG
 ### =============================
@@ -11,46 +19,6 @@ STRICT_MAP_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Result
 OUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Evaluation/strict_mapping_vs_gs.json"
 
 
-### ===== TARGET BIOMARKERS =====
-
-TARGET_BIOMARKERS = [
-    # ===== BRCA GENERAL =====
-    "brca","brca1","brca2","gbrca","brca mutation","pathogenic brca",
-    "germline brca","somatic brca","brca-deficient","brca deficiency",
-    "brca loss","brca1/2","brca vus","variant of uncertain significance",
-
-    # ===== BRCA SPECIFIC =====
-    "brca1 mutation (germline)", "brca1 mutation (somatic)",
-    "brca2 mutation (germline)", "brca2 mutation (somatic)",
-    "brca1 vus", "brca2 vus", "gbrca1 mutation", "gbrca2 mutation",
-
-    # ===== HER2 / ERBB2 GENERAL =====
-    "her2","erbb2","her2+","her2 positive","her2 positive expression",
-    "her2-positive","her2-expressing","her2 overexpression",
-    "ihc 3+","her2 ihc","her2 ihc 1+ or above",
-
-    # ===== HER2 AMPLIFICATION =====
-    "her2 amplification","erbb2 amplification",
-    "her2 amplification (ngs)",
-    "her2 amplification (ish her2/cep17 ≥ 2.0)",
-
-    # ===== HER2 MUTATIONS =====
-    "her2 mutation", "her2 mutant", "erbb2 mutant",
-    "her2 l755a","her2 l755s","her2 v777l",
-    "her2 v659e","her2 s310f",
-
-    # ===== EXON 20 INSERTIONS =====
-    "exon 20 insertion","her2 exon 20 insertion mutation",
-    "her2 exon 20 insertion (insyvma)",
-    "her2 exon 20 insertion (insgsp)",
-    "her2 exon 20 insertion (instgt)",
-    "insyvma","insgsp","instgt",
-
-    # ===== HER2 TARGETed =====
-    "her2-targeted","anti-her2"
-]
-
-
 ### =============================
 ### HELPER FUNCTIONS
 ### =============================
@@ -64,37 +32,26 @@ def flatten(lst):
             out.append(x)
     return out
 
-def is_target(term):
-    """Check if term belongs to BRCA/HER2 family."""
-    t = term.lower()
-    return any(key in t for key in TARGET_BIOMARKERS)
-
-
 ### =============================
 ### LOAD DATA
 ### =============================
-gs = json.load(open(GS_FILE))
-llm = json.load(open(LLM_FILE))
 strict_map = json.load(open(STRICT_MAP_FILE))
 
-llm_dict = {x["nct_id"]: x for x in llm}
-
+llm_dict = dict(iter_trials(LLM_FILE))
 
-### =============================
-### EVALUATION COUNTERS
-### =============================
-TP = FP = FN = 0
-per_trial_result = {}
 
 ### =============================
 ### MAIN LOOP
 ### =============================
-for nct_id, item in gs.items():
+trial_ids = []
+gs_rows = []
+llm_rows = []
+
+for nct_id, item in iter_trials(GS_FILE):
 
     gs_bm = flatten(item.get("inclusion_biomarker", [])) + \
             flatten(item.get("exclusion_biomarker", []))
     gs_bm = [x.lower() for x in gs_bm if is_target(x)]
-    gs_set = set(gs_bm)
 
     llm_item = llm_dict.get(nct_id, {})
     llm_bm = flatten(llm_item.get("inclusion_biomarker", [])) + \
@@ -107,43 +64,35 @@ for nct_id, item in gs.items():
         if b in strict_map and strict_map[b] is not None and is_target(b):
             llm_strict_kept.append(b)
 
-    llm_set = set(llm_strict_kept)
-
-    # Metrics
-    tp = len(gs_set & llm_set)
-    fp = len(llm_set - gs_set)
-    fn = len(gs_set - llm_set)
-
-    TP += tp
-    FP += fp
-    FN += fn
-
-    per_trial_result[nct_id] = {
-        "gs": list(gs_set),
-        "llm_strict": list(llm_set),
-        "TP": tp,
-        "FP": fp,
-        "FN": fn
-    }
+    trial_ids.append(nct_id)
+    gs_rows.append(gs_bm)
+    llm_rows.append(llm_strict_kept)
 
 
 ### =============================
 ### METRICS
 ### =============================
-precision = TP / (TP + FP) if TP + FP else 0
-recall = TP / (TP + FN) if TP + FN else 0
-f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
-
-summary = {
-    "TP": TP,
-    "FP": FP,
-    "FN": FN,
-    "Precision": precision,
-    "Recall": recall,
-    "F1": f1,
-    "per_trial": per_trial_result
+terms = Interner()
+gs_sets = TrialSets.from_lists(gs_rows, terms)
+llm_sets = TrialSets.from_lists(llm_rows, terms)
+tp, fp, fn = confusion(gs_sets, llm_sets)
+
+per_trial_result = {
+    nct_id: {
+        "gs": gs_sets.terms(i),
+        "llm_strict": llm_sets.terms(i),
+        "TP": int(tp[i]),
+        "FP": int(fp[i]),
+        "FN": int(fn[i])
+    }
+    for i, nct_id in enumerate(trial_ids)
 }
 
+summary = scores(tp, fp, fn)
+summary["CI"] = bootstrap_ci(tp, fp, fn)
+summary["per_trial"] = per_trial_result
+precision, recall, f1 = summary["Precision"], summary["Recall"], summary["F1"]
+
 json.dump(summary, open(OUT_FILE, "w"), indent=2)
 print("Saved evaluation →", OUT_FILE)
 print(f"P={precision:.3f}, R={recall:.3f}, F1={f1:.3f}")
\ No newline at end of file
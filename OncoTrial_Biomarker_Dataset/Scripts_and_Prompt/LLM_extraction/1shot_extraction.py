@@ -1,59 +1,309 @@
-import json
+import argparse
+import os
+import sys
 from openai import OpenAI
 
-client = OpenAI()
+from extraction_engine import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    MODEL,
+    TEMPERATURE,
+    extract_all,
+    make_rate_controller,
+    parse_output,
+    render_prompt,
+    to_result)
+from response_cache import DEFAULT_MAX_BYTES, ResponseCache, cache_key
+from result_stream import ResultWriter, done_ids
+from convert_jsonl_to_results import convert
+from sentence_windows import DEFAULT_CONTEXT, window_text
+from relevance_gate import GateStats
+from batch_extraction import ingest_batch_output, write_batch_file
+from extraction_manifest import ExtractionManifest, prompt_version, text_hash
+from request_packing import DEFAULT_BUDGET, DEFAULT_MAX_TRIALS, extract_packed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_trials
+from common.text_index import TextIndex
+
+client = None
+cache = None
+rate = None
 
 PROMPT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Scripts_and_Prompt/LLM_extraction/biomarker_extraction_1shot.txt"
+PACKED_PROMPT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Scripts_and_Prompt/LLM_extraction/biomarker_extraction_1shot_packed.txt"
 INPUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Raw_data/random_trials.json"
 OUTPUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.json"
+CHECKPOINT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.jsonl"
+BATCH_INPUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot_batch_input.jsonl"
+BATCH_OUTPUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot_batch_output.jsonl"
+CACHE_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/.response_cache.sqlite"
+MANIFEST_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.manifest.json"
 
 
-def load_prompt():
-    with open(PROMPT_FILE, "r") as f:
+def load_prompt(path=None):
+    with open(path or PROMPT_FILE, "r") as f:
         return f.read()
 
 
 def extract_structured(text):
-    prompt = load_prompt().replace("{{trial_text}}", text)
+    prompt = render_prompt(load_prompt(), text)
+    key = cache_key(prompt, MODEL, TEMPERATURE)
+
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
 
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
+    resp = rate.call(
+        client.chat.completions.create,
+        model=MODEL,
+        temperature=TEMPERATURE,
         messages=[{"role": "user", "content": prompt}]
     )
 
-    return resp.choices[0].message.content
+    raw_output = resp.choices[0].message.content
+    if cache is not None:
+        cache.put(key, raw_output, MODEL)
+    return raw_output
+
+
+def run_serial(trials, writer):
+    for nct_id, text in trials:
+        print(f"Extracting → {nct_id}")
+
+        raw_output = extract_structured(text)
+        writer.write(to_result(nct_id, parse_output(raw_output)))
+
+
+def report_failed(failed):
+    """Failed trials are not in the checkpoint; a --resume run retries them."""
+    if failed:
+        print(f"{len(failed)} failed trials, not written (rerun with --resume): "
+              f"{', '.join(failed[:20])}")
+
+
+def run_async(trials, writer, concurrency, timeout, base_url):
+    _, stats = extract_all(
+        trials,
+        load_prompt(),
+        concurrency=concurrency,
+        timeout=timeout,
+        base_url=base_url,
+        cache=cache,
+        rate=rate,
+        on_result=writer.write
+    )
+
+    print(f"Async run: {stats['done']} trials in {stats['seconds']:.1f}s "
+          f"(concurrency={concurrency}, cached={stats['cached']}, "
+          f"timeouts={stats['timeouts']}, errors={stats['errors']})")
+    report_failed(stats["failed"])
+
+
+def run_packed(trials, writer, concurrency, timeout, base_url, budget, max_trials):
+    stats = extract_packed(
+        trials,
+        load_prompt(PACKED_PROMPT_FILE),
+        load_prompt(),
+        budget=budget,
+        max_trials=max_trials,
+        concurrency=concurrency,
+        timeout=timeout,
+        base_url=base_url,
+        cache=cache,
+        rate=rate,
+        on_result=writer.write
+    )
+
+    print(f"Packed run: {stats['done']} trials in {stats['seconds']:.1f}s "
+          f"({stats['packed_requests']} packed + {stats['single_requests']} single requests, "
+          f"fallbacks={stats['fallbacks']}, errors={stats['errors']})")
+    report_failed(stats["failed"])
+
+
+def gated(trials, gate, writer, skipped):
+    """Write empty results for trials without a target mention (added to `skipped`); yield the rest."""
+    for nct_id, text in trials:
+        if gate.check(text, nct_id):
+            yield nct_id, text
+        else:
+            writer.write(to_result(nct_id, parse_output(None)))
+            skipped.add(nct_id)
+
+
+def run_version(args):
+    """
+    Manifest version of this run: the prompt template(s) plus every option
+    that changes what the model sees (gate, sentence windows, packing).
+    batch-ingest must be given the same options as the batch-write run.
+    """
+    parts = [load_prompt()]
+    if args.mode == "packed":
+        parts += [load_prompt(PACKED_PROMPT_FILE), f"packed:{args.pack_budget}:{args.pack_max_trials}"]
+    if args.gate:
+        parts.append("gate")
+    if args.windowed:
+        parts.append(f"windowed:{args.window_context}")
+    return prompt_version("\n".join(parts))
+
+
+def update_manifest(manifest, writer, documents, version, skipped=()):
+    """
+    Record every trial the model answered in this run with its current
+    document hash; gate placeholders (`skipped`) are left out.
+    """
+    for nct_id in writer.written:
+        if nct_id in documents and nct_id not in skipped:
+            manifest.record(nct_id, documents[nct_id], version, MODEL)
+    manifest.save()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="1-shot HER2/BRCA biomarker extraction")
+    parser.add_argument("--mode", choices=["serial", "async", "packed", "batch-write", "batch-ingest"],
+                        default="serial",
+                        help="packed bins several trials per request; "
+                             "batch-write renders a Batch API input file; "
+                             "batch-ingest reads the returned Batch output file")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="max requests in flight (async / packed mode)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="per-request timeout in seconds (async / packed mode)")
+    parser.add_argument("--rps", type=float, default=None,
+                        help="max OpenAI requests per second (token bucket); default unlimited")
+    parser.add_argument("--pack-budget", type=int, default=DEFAULT_BUDGET,
+                        help="prompt token budget per packed request (packed mode)")
+    parser.add_argument("--pack-max-trials", type=int, default=DEFAULT_MAX_TRIALS,
+                        help="max trials per packed request (packed mode)")
+    parser.add_argument("--base-url", default=None,
+                        help="OpenAI-compatible endpoint, e.g. a local mock_openai_server.py")
+    parser.add_argument("--cache-file", default=CACHE_FILE)
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="LRU size bound of the response cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the response cache and always call the API")
+    parser.add_argument("--gate", action="store_true",
+                        help="skip the LLM for trials with no HER2/ERBB2/BRCA mention")
+    parser.add_argument("--gate-index", default=None,
+                        help="text index of --input (common/text_index.py); the gate only "
+                             "regex-checks the trials it returns as candidates")
+    parser.add_argument("--windowed", action="store_true",
+                        help="send only sentence windows around HER2/ERBB2/BRCA mentions")
+    parser.add_argument("--window-context", type=int, default=DEFAULT_CONTEXT,
+                        help="sentences kept on each side of a mention (--windowed)")
+    parser.add_argument("--batch-input", default=BATCH_INPUT_FILE,
+                        help="Batch API input JSONL written by batch-write")
+    parser.add_argument("--batch-output", default=BATCH_OUTPUT_FILE,
+                        help="Batch API output JSONL read by batch-ingest")
+    parser.add_argument("--input", default=INPUT_FILE,
+                        help="raw trials as a JSON object keyed by NCT ID, or JSONL (streamed)")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE,
+                        help="append-only JSONL file written as each trial finishes")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep the checkpoint and skip NCT IDs already in it")
+    parser.add_argument("--incremental", action="store_true",
+                        help="extract only trials that are new or whose document, prompt or model "
+                             "changed since the last run (see --manifest); merge them into the "
+                             "existing results and drop trials no longer in the input")
+    parser.add_argument("--manifest", default=MANIFEST_FILE,
+                        help="per-trial document / prompt / model hashes (--incremental)")
+    return parser.parse_args()
 
 
 def main():
-    data = json.load(open(INPUT_FILE))
+    global client, cache, rate
 
-    results = []
+    args = parse_args()
 
-    for nct_id, entry in data.items():
-        print(f"Extracting → {nct_id}")
+    # one streamed pass for the trial order (and document hashes for
+    # --incremental); documents are streamed again as they are extracted
+    order, documents = [], {}
+    for nct_id, entry in iter_trials(args.input):
+        order.append(nct_id)
+        if args.incremental:
+            documents[nct_id] = text_hash(entry.get("document", ""))
 
-        text = entry.get("document", "")
-        raw_output = extract_structured(text)
+    # incremental runs keep the checkpoint and only drop trials gone from the input
+    keep = set(order) if args.incremental else None
+    manifest = ExtractionManifest(args.manifest) if args.incremental else None
+    version = run_version(args) if args.incremental else None
+
+    if args.mode == "batch-ingest":
+        with ResultWriter(args.checkpoint, resume=True) as writer:
+            stats = ingest_batch_output(args.batch_output, writer)
+        print(f"Ingested {stats['ingested']} batch results →", args.checkpoint)
+        report_failed(stats["failed"])
+        if manifest is not None:
+            update_manifest(manifest, writer, documents, version)
+
+        total = convert(args.checkpoint, args.output, order=order, keep=keep)
+        print(f"Saved {total} trials →", args.output)
+        return
+
+    # batch-write sends no requests, so it needs no response cache
+    if args.mode != "batch-write":
+        cache = ResponseCache(
+            args.cache_file,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            enabled=not args.no_cache
+        )
+
+    rate = make_rate_controller(args.concurrency if args.mode != "serial" else 1, args.rps)
+
+    if manifest is not None:
+        to_extract, unchanged, deleted = manifest.plan(documents, version, MODEL, done_ids(args.checkpoint))
+        manifest.prune(deleted)
+        skip = set(unchanged)
+        print(f"Incremental: {len(to_extract)} new or changed, {len(unchanged)} unchanged, "
+              f"{len(deleted)} deleted trials")
+    else:
+        skip = done_ids(args.checkpoint) if args.resume else set()
+        if skip:
+            print(f"Resuming: {len(skip)} trials already in {args.checkpoint}")
+
+    trials = (
+        (nct_id, entry.get("document", ""))
+        for nct_id, entry in iter_trials(args.input)
+        if nct_id not in skip
+    )
+
+    skipped = set()
+    with ResultWriter(args.checkpoint, resume=args.resume or args.incremental) as writer:
+        gate = GateStats(TextIndex(args.gate_index) if args.gate and args.gate_index else None)
+        if args.gate:
+            trials = gated(trials, gate, writer, skipped)
+        if args.windowed:
+            trials = ((nct_id, window_text(text, args.window_context)) for nct_id, text in trials)
+
+        if args.mode == "batch-write":
+            n_requests = write_batch_file(trials, load_prompt(), args.batch_input)
+        elif args.mode == "async":
+            run_async(trials, writer, args.concurrency, args.timeout, args.base_url)
+        elif args.mode == "packed":
+            run_packed(trials, writer, args.concurrency, args.timeout, args.base_url,
+                       args.pack_budget, args.pack_max_trials)
+        else:
+            client = OpenAI(base_url=args.base_url, max_retries=0)
+            run_serial(trials, writer)
 
-        # Parse JSON output
-        try:
-            parsed = json.loads(raw_output)
-        except:
-            parsed = {
-                "inclusion_biomarker": [],
-                "exclusion_biomarker": []
-            }
+    print(f"Streamed {writer.count} new trials →", args.checkpoint)
+    if manifest is not None:
+        update_manifest(manifest, writer, documents, version, skipped)
+    if args.gate:
+        print(gate.summary())
 
-        results.append({
-            "nct_id": nct_id,
-            "inclusion_biomarker": parsed.get("inclusion_biomarker", []),
-            "exclusion_biomarker": parsed.get("exclusion_biomarker", [])
-        })
+    if args.mode == "batch-write":
+        print(f"Wrote {n_requests} batch requests →", args.batch_input)
+        print("Run --mode batch-ingest on the returned output file to finish.")
+        return
 
-    json.dump(results, open(OUTPUT_FILE, "w"), indent=2)
-    print("Saved →", OUTPUT_FILE)
+    total = convert(args.checkpoint, args.output, order=order, keep=keep)
+    print(f"Saved {total} trials →", args.output)
+    print(cache.summary())
+    print(rate.summary())
+    cache.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,86 @@
+"""
+OpenAI Batch-file Extraction
+------------------------------------------
+Offline halves of a Batch API run for nightly full-corpus extraction.
+
+1. `write_batch_file()` renders every trial's prompt into a Batch input
+   JSONL file (one /v1/chat/completions request per line, custom_id =
+   NCT ID); upload it with the Batch API
+2. `ingest_batch_output()` reads the returned Batch output JSONL and
+   writes per-trial results to the extraction checkpoint
+   (gpt-4.0-turbo_1shot.jsonl); failed requests are reported and left out,
+   so a `--resume` run can fill them in
+
+Both halves only touch local files.
+"""
+
+import json
+import os
+
+from extraction_engine import MODEL, TEMPERATURE, parse_output, render_prompt, to_result
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def batch_request(nct_id, prompt, model=MODEL):
+    """One Batch API input line."""
+    return {
+        "custom_id": nct_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": TEMPERATURE,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+    }
+
+
+def write_batch_file(trials, template, path, model=MODEL):
+    """Write (nct_id, document) pairs as a Batch input JSONL file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for nct_id, text in trials:
+            request = batch_request(nct_id, render_prompt(template, text), model)
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_batch_output(path):
+    """Yield (custom_id, content) per Batch output line; content is None on failure."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            nct_id = record.get("custom_id")
+
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                yield nct_id, None
+                continue
+
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                content = None
+            yield nct_id, content
+
+
+def ingest_batch_output(path, writer):
+    """Write successful Batch results to `writer`; return ingest statistics."""
+    stats = {"ingested": 0, "failed": []}
+    for nct_id, content in read_batch_output(path):
+        if content is None:
+            stats["failed"].append(nct_id)
+            continue
+        writer.write(to_result(nct_id, parse_output(content)))
+        stats["ingested"] += 1
+    return stats
@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+
+from result_stream import iter_results
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_trials
+
+INPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.jsonl"
+OUTPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.json"
+
+# Optional: order trials as in the raw dataset instead of completion order
+RAW_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Raw_data/random_trials.json"
+
+
+def convert(input_path, output_path, order=None, keep=None):
+    """
+    Write a JSONL checkpoint as the gpt-4.0-turbo_1shot.json list layout;
+    if `keep` is given, trials not in it are left out.
+    """
+    results = [
+        {
+            "nct_id": r["nct_id"],
+            "inclusion_biomarker": r.get("inclusion_biomarker", []),
+            "exclusion_biomarker": r.get("exclusion_biomarker", [])
+        }
+        for r in iter_results(input_path)
+        if keep is None or r["nct_id"] in keep
+    ]
+
+    if order is not None:
+        rank = {nct_id: i for i, nct_id in enumerate(order)}
+        results.sort(key=lambda r: rank.get(r["nct_id"], len(rank)))
+
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    return len(results)
+
+
+def main():
+    try:
+        order = [nct_id for nct_id, _ in iter_trials(RAW_FILE)]
+    except FileNotFoundError:
+        order = None
+
+    total = convert(INPUT, OUTPUT, order)
+
+    print("Converted file saved to:")
+    print(OUTPUT)
+    print("Total trials:", total)
+
+
+if __name__ == "__main__":
+    main()
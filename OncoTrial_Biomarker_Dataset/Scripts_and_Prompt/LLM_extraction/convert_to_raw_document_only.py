@@ -1,27 +1,27 @@
-import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_trials, write_trials
 
 INPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Raw_data/random_trials_.json"
 OUTPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Raw_data/random_trials.json"
 
-def main():
-    with open(INPUT, "r") as f:
-        data = json.load(f)
-
-    out = {}
-
-    for nct_id, entry in data.items():
+def documents_only(pairs):
+    for nct_id, entry in pairs:
         if "document" in entry:
-            out[nct_id] = {"document": entry["document"]}
+            yield nct_id, {"document": entry["document"]}
         else:
             print(f"Warning: No document in {nct_id}")
 
-    with open(OUTPUT, "w") as f:
-        json.dump(out, f, indent=2)
+def main():
+    # streamed in and out; .jsonl input / output paths are accepted too
+    total = write_trials(documents_only(iter_trials(INPUT)), OUTPUT)
 
     print("Converted file saved to:")
     print(OUTPUT)
-    print("Total trials:", len(out))
+    print("Total trials:", total)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -16,6 +16,10 @@ from utils.jsons import (
     dump_json,
     loads_json)
 from utils.evaluation import compute_evals, save_eval, get_metrics
+from response_cache import DEFAULT_MAX_BYTES, ResponseCache, cache_key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.rate_control import RateController
 
 
 def find_trial(k, trials):
@@ -26,6 +30,19 @@ def find_trial(k, trials):
         return None, None
 
 
+def run_chain(llm_chain, prompt_template, inputs, cache, model, temperature, rate):
+    """Call the LLM chain, answering from the response cache when possible."""
+    key = cache_key(prompt_template.format(**inputs), model, temperature)
+    cached = cache.get(key)
+    if cached is not None:
+        return {**inputs, 'text': cached}
+
+    response = rate.call(llm_chain, inputs)
+    if isinstance(response, dict) and isinstance(response.get('text'), str):
+        cache.put(key, response['text'], model)
+    return response
+
+
 @hydra.main(version_base=None, config_path="../conf", config_name="config")
 def main(cfg: DictConfig):
     n_shot = cfg.GPT_EVAL.n_shot
@@ -82,6 +99,16 @@ def main(cfg: DictConfig):
         logger.error(f"Failed to set up GPTHandler {e}")
         sys.exit(1)
 
+    # set up response cache (disable with GPT_EVAL.use_cache=false)
+    temperature = cfg.GPT_EVAL.get("temperature", 0)
+    cache = ResponseCache(
+        cfg.GPT_EVAL.get("cache_file") or os.path.join(cfg.data.results_dir, ".response_cache.sqlite"),
+        max_bytes=cfg.GPT_EVAL.get("cache_max_bytes", DEFAULT_MAX_BYTES),
+        enabled=cfg.GPT_EVAL.get("use_cache", True))
+
+    # retry/backoff on 429/5xx/timeouts, optional GPT_EVAL.requests_per_second cap
+    rate = RateController(rate=cfg.GPT_EVAL.get("requests_per_second"), concurrency=1, name="openai")
+
     start_time = time.time()
 
     tp_inc, tn_inc, fp_inc, fn_inc = [], [], [], []
@@ -104,7 +131,7 @@ def main(cfg: DictConfig):
             input_trial = i['input']
 
             if n_shot == 0:
-                response = llm_chain({'trial': input_trial})
+                response = run_chain(llm_chain, prompt_template, {'trial': input_trial}, cache, model, temperature, rate)
             else:
                 example_id = "NCT03383575"
                 example_doc, example_output = find_trial(example_id, train_set['ids'])
@@ -114,9 +141,9 @@ def main(cfg: DictConfig):
                     example_doc, example_output = find_trial(example_id, train_set['ids'])
                     example_2 = f"""{example_doc}\nJSON:{example_output}"""
 
-                    response = llm_chain({'trial': input_trial, 'example': example, 'example2': example_2})
+                    response = run_chain(llm_chain, prompt_template, {'trial': input_trial, 'example': example, 'example2': example_2}, cache, model, temperature, rate)
                 else:
-                    response = llm_chain({'trial': input_trial, 'example': example})
+                    response = run_chain(llm_chain, prompt_template, {'trial': input_trial, 'example': example}, cache, model, temperature, rate)
             logger.info(f"Actual: {actual} \n Response: {response}")
             try:
                 response['text']
@@ -153,6 +180,9 @@ def main(cfg: DictConfig):
 
     end_time = time.time()
     latency = end_time - start_time
+    logger.info(cache.summary())
+    logger.info(rate.summary())
+    cache.close()
 
     # Get Precision, recall, f1 score and accuracy
     inc = get_metrics(tp=sum(tp_inc), tn=sum(tn_inc), fp=sum(fp_inc), fn=sum(fn_inc))
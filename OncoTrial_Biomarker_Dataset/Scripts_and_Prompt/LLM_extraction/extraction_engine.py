@@ -0,0 +1,194 @@
+"""
+Async Extraction Engine
+------------------------------------------
+Runs the 1-shot biomarker extraction prompt against an OpenAI-compatible
+endpoint with a bounded number of requests in flight.
+
+1. A fixed pool of workers pulls (nct_id, document) pairs from a queue
+2. Each request is wrapped in a per-request timeout
+3. Trials whose request still fails / times out after the retries are not
+   written; their NCT IDs are returned in `stats["failed"]`, so a
+   `--resume` run picks them up
+4. Results are collected by NCT ID and returned in input order, or
+   handed to an `on_result` callback as each trial finishes
+5. An optional ResponseCache answers repeated prompts without an API call
+6. Every request goes through a RateController (common/rate_control.py):
+   token bucket, retry with backoff on 429/5xx/timeouts, AIMD in-flight
+   limit; the OpenAI client's own retries are switched off
+
+Throughput scales with the concurrency limit instead of round-trip time.
+Point `base_url` at `mock_openai_server.py` to exercise it offline.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+from openai import AsyncOpenAI
+
+from response_cache import cache_key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.rate_control import RateController
+
+
+### ============================================================
+###  CONFIG
+### ============================================================
+
+MODEL = "gpt-4o"
+TEMPERATURE = 0
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 60.0  # seconds per request
+
+
+
+### ============================================================
+###  PART 1 — PROMPT + OUTPUT HELPERS
+### ============================================================
+
+def render_prompt(template, text):
+    """Insert the trial text into the extraction prompt template."""
+    return template.replace("{{trial_text}}", text)
+
+
+def parse_output(raw_output):
+    """Parse the model's JSON answer; fall back to empty lists."""
+    try:
+        parsed = json.loads(raw_output)
+    except (TypeError, ValueError):
+        parsed = {}
+
+    if not isinstance(parsed, dict):
+        parsed = {}
+
+    return {
+        "inclusion_biomarker": parsed.get("inclusion_biomarker", []),
+        "exclusion_biomarker": parsed.get("exclusion_biomarker", [])
+    }
+
+
+def to_result(nct_id, parsed):
+    """Per-trial record in the gpt-4.0-turbo_1shot.json layout."""
+    return {
+        "nct_id": nct_id,
+        "inclusion_biomarker": parsed.get("inclusion_biomarker", []),
+        "exclusion_biomarker": parsed.get("exclusion_biomarker", [])
+    }
+
+
+
+### ============================================================
+###  PART 2 — ASYNC WORKER POOL
+### ============================================================
+
+async def complete(client, prompt, model, timeout, rate):
+    """One chat completion, each attempt bounded by `timeout` seconds."""
+    resp = await rate.call_async(
+        lambda: asyncio.wait_for(
+            client.chat.completions.create(
+                model=model,
+                temperature=TEMPERATURE,
+                messages=[{"role": "user", "content": prompt}]
+            ),
+            timeout=timeout
+        )
+    )
+    return resp.choices[0].message.content
+
+
+def make_rate_controller(concurrency=DEFAULT_CONCURRENCY, rps=None):
+    """Rate controller for OpenAI calls: `rps` requests/second, AIMD up to `concurrency`."""
+    return RateController(rate=rps, concurrency=concurrency, name="openai")
+
+
+async def _worker(queue, client, template, model, timeout, cache, rate, on_result, stats):
+    while True:
+        item = await queue.get()
+        if item is None:
+            queue.task_done()
+            return
+
+        nct_id, text = item
+        prompt = render_prompt(template, text)
+        key = cache_key(prompt, model, TEMPERATURE)
+
+        raw_output = cache.get(key) if cache is not None else None
+        if raw_output is not None:
+            stats["cached"] += 1
+        else:
+            try:
+                raw_output = await complete(client, prompt, model, timeout, rate)
+                if cache is not None:
+                    cache.put(key, raw_output, model)
+            except asyncio.TimeoutError:
+                print(f"Timeout after retries → {nct_id}")
+                stats["timeouts"] += 1
+            except Exception as e:
+                print(f"Failed → {nct_id}: {e}")
+                stats["errors"] += 1
+
+        if raw_output is None:
+            stats["failed"].append(nct_id)
+        else:
+            on_result(to_result(nct_id, parse_output(raw_output)))
+            stats["done"] += 1
+            print(f"Extracted → {nct_id} ({stats['done']})")
+        queue.task_done()
+
+
+async def extract_all_async(trials, template, model=MODEL,
+                            concurrency=DEFAULT_CONCURRENCY,
+                            timeout=DEFAULT_TIMEOUT, base_url=None,
+                            client=None, cache=None, rate=None, on_result=None):
+    """
+    Extract biomarkers for every (nct_id, document) pair in `trials`.
+
+    At most `concurrency` requests are in flight at once (fewer while the
+    rate controller backs off). Prompts already in `cache` are answered
+    locally. If `on_result` is given, each result
+    is passed to it as soon as it finishes and nothing is kept in memory;
+    otherwise the per-trial results are returned in input order. Run
+    statistics are returned in both cases; trials that failed have no
+    result and are listed in `stats["failed"]`.
+    """
+    if client is None:
+        client = AsyncOpenAI(base_url=base_url, max_retries=0)
+    if rate is None:
+        rate = make_rate_controller(concurrency)
+
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    results = {}
+    order = []
+    stats = {"done": 0, "cached": 0, "timeouts": 0, "errors": 0, "failed": []}
+
+    collect = on_result is None
+    if collect:
+        def on_result(record):
+            results[record["nct_id"]] = record
+
+    workers = [
+        asyncio.create_task(_worker(queue, client, template, model, timeout, cache, rate, on_result, stats))
+        for _ in range(concurrency)
+    ]
+
+    start = time.time()
+    for nct_id, text in trials:
+        if collect:
+            order.append(nct_id)
+        await queue.put((nct_id, text))
+    for _ in workers:
+        await queue.put(None)
+
+    await asyncio.gather(*workers)
+    stats["seconds"] = time.time() - start
+
+    return [results[nct_id] for nct_id in order if nct_id in results], stats
+
+
+def extract_all(trials, template, **kwargs):
+    """Synchronous entry point around `extract_all_async`."""
+    return asyncio.run(extract_all_async(trials, template, **kwargs))
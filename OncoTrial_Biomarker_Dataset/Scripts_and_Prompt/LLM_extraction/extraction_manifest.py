@@ -0,0 +1,77 @@
+"""
+Extraction Manifest
+------------------------------------------
+Per-trial record of what the current extraction results were made from,
+so `1shot_extraction.py --incremental` only re-extracts what changed.
+
+1. For every trial the model answered, the manifest stores the SHA-256 of
+   its `document`, the prompt version (hash of the prompt template(s) and
+   the options that change the result: gate, sentence windows, packing) and
+   the model; gate placeholders and failed requests are not recorded
+2. `plan()` compares the manifest with the raw dataset and the checkpoint:
+   - new trials, trials whose document / prompt / model changed, and
+     trials missing from the checkpoint are extracted
+   - everything else is kept as is
+   - NCT IDs no longer in the dataset are pruned from manifest and output
+3. The manifest is a JSON file next to the checkpoint, replaced atomically;
+   a trial is only recorded after its result line has been written
+"""
+
+import hashlib
+import json
+import os
+
+
+def text_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def prompt_version(template):
+    return text_hash(template)[:16]
+
+
+class ExtractionManifest:
+    """{nct_id: {"document", "prompt", "model"}} stored as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.trials = json.load(f).get("trials", {})
+
+    def plan(self, documents, prompt, model, done=()):
+        """
+        (to_extract, unchanged, deleted) NCT ID lists, given the current
+        {nct_id: text_hash(document)} of the raw dataset.
+        """
+        done = set(done)
+        to_extract, unchanged = [], []
+        for nct_id, document in documents.items():
+            record = self.trials.get(nct_id)
+            if (record is not None and nct_id in done
+                    and record.get("document") == document
+                    and record.get("prompt") == prompt
+                    and record.get("model") == model):
+                unchanged.append(nct_id)
+            else:
+                to_extract.append(nct_id)
+        deleted = [nct_id for nct_id in self.trials if nct_id not in documents]
+        return to_extract, unchanged, deleted
+
+    def record(self, nct_id, document, prompt, model):
+        """`document` is the text_hash() of the trial document."""
+        self.trials[nct_id] = {"document": document, "prompt": prompt, "model": model}
+
+    def prune(self, nct_ids):
+        for nct_id in nct_ids:
+            self.trials.pop(nct_id, None)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"trials": self.trials}, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,117 @@
+"""
+Local OpenAI-compatible stand-in server
+------------------------------------------
+Answers POST /v1/chat/completions with a canned extraction so the
+extraction scripts can be exercised offline:
+
+    python mock_openai_server.py --port 8000 --delay 0.5
+    OPENAI_API_KEY=test python 1shot_extraction.py --mode async \
+        --base-url http://127.0.0.1:8000/v1
+
+The reply lists every HER2/ERBB2/BRCA mention found in the prompt's trial
+text as an inclusion biomarker; packed prompts ("### <NCT ID>" blocks) get
+one such object per trial. `--delay` simulates network latency and
+`--fail-rate` answers that fraction of requests with a 429 or 503, to
+exercise the retry / backoff path.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+MENTION = re.compile(r"\b(her-?2|erbb-?2|g?brca[12]?)\b", re.IGNORECASE)
+PACKED_TRIAL = re.compile(r"^### (NCT\d+)\n", re.MULTILINE)
+
+
+def _fake_result(text):
+    found = sorted({m.group(0).upper() for m in MENTION.finditer(text)})
+    return {
+        "inclusion_biomarker": found,
+        "exclusion_biomarker": []
+    }
+
+
+def fake_extraction(prompt):
+    """Very small rule-based stand-in for the model's answer."""
+    if "Now extract biomarkers from these trials:" in prompt:
+        text = prompt.rsplit("Now extract biomarkers from these trials:", 1)[-1]
+        parts = PACKED_TRIAL.split(text)[1:]
+        return json.dumps({
+            nct_id: _fake_result(block) for nct_id, block in zip(parts[::2], parts[1::2])
+        })
+
+    text = prompt.rsplit("Now extract biomarkers from this text:", 1)[-1]
+    return json.dumps(_fake_result(text))
+
+
+class Handler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+
+        time.sleep(self.delay)
+
+        if random.random() < self.fail_rate:
+            status = random.choice([429, 503])
+            error = json.dumps({"error": {"message": "mock failure", "type": "mock", "code": status}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(error)))
+            if status == 429:
+                self.send_header("Retry-After", "0.1")
+            self.end_headers()
+            self.wfile.write(error)
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": fake_extraction(prompt)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds of simulated latency per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    args = parser.parse_args()
+
+    Handler.delay = args.delay
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Mock OpenAI server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Trial-level Relevance Gate
+------------------------------------------
+Fast lexical check that decides whether a trial needs an LLM call at all.
+
+1. Vocabulary = GENE_ALIASES (keys + canonical symbols) + TARGET_BIOMARKERS
+   from common/vocabulary.py, reduced to the shortest distinct terms
+2. Terms match as substrings, like `is_target()` (gBRCA1 → "brca");
+   letter→digit joins accept an optional dash/space (HER-2, BRCA 1)
+3. Bare-word aliases such as "neu" only match as whole words, so
+   "neuroblastoma" / "pneumonia" do not open the gate
+4. Trials without a match get empty inclusion/exclusion lists directly
+5. With a text index of the input (common/text_index.py) the gate first
+   asks the index for candidate trials: every way a gate term can fall on
+   indexed tokens (HER2 in one token, HER-2 / HER 2 as a token pair, ...) is
+   a phrase query. The candidates are a superset of the regex matches, so
+   only candidates - and trials not indexed with this exact document - are
+   regex-checked; the decisions are the same as without the index
+
+Running this file audits the gate on the gold standard: skip rate, and how
+many gold HER2/BRCA biomarkers sit in trials the gate would have skipped.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_trials
+from common.target_matcher import is_target
+from common.text_index import TOKEN, TextIndex
+from common.vocabulary import GENE_ALIASES, TARGET_BIOMARKERS
+
+
+### ============================================================
+###  CONFIG
+### ============================================================
+
+RAW_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Raw_data/random_trials.json"
+GS_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
+
+
+
+### ============================================================
+###  PART 1 — GATE PATTERN
+### ============================================================
+
+def _minimal_terms(terms):
+    """Drop every term that already contains a shorter vocabulary term."""
+    terms = sorted({t.lower() for t in terms}, key=len)
+    kept = []
+    for t in terms:
+        if not any(k in t for k in kept):
+            kept.append(t)
+    return kept
+
+
+def _term_pattern(term):
+    pattern = re.escape(term)
+    # HER2 / HER-2 / HER 2, BRCA1 / BRCA-1
+    pattern = re.sub(r"(?<=[a-z])(?=\d)", r"[-\\s]?", pattern)
+    if term.isalpha() and term in GENE_ALIASES:
+        pattern = r"(?<![a-z])" + pattern + r"(?![a-z])"
+    return pattern
+
+
+GATE_TERMS = _minimal_terms(
+    list(GENE_ALIASES) + list(GENE_ALIASES.values()) + TARGET_BIOMARKERS
+)
+
+GATE_PATTERN = re.compile(
+    "|".join(_term_pattern(t) for t in GATE_TERMS),
+    re.IGNORECASE
+)
+
+DASHES = str.maketrans({"–": "-", "—": "-", "‐": "-", "‑": "-"})
+
+
+def mentions_target(text):
+    """True if `text` mentions any HER2/ERBB2/BRCA vocabulary term."""
+    return GATE_PATTERN.search(text.translate(DASHES)) is not None
+
+
+
+### ============================================================
+###  PART 2 — INDEX CANDIDATES
+### ============================================================
+
+def _spellings(term):
+    """`term` with every letter→digit join either closed or opened (HER2, HER 2)."""
+    parts = re.split(r"(?<=[a-z])(?=\d)", term)
+    variants = [parts[0]]
+    for part in parts[1:]:
+        variants = [v + sep + part for v in variants for sep in ("", " ")]
+    return variants
+
+
+def _slot_predicates(term):
+    """
+    Token predicates, one per position, for every spelling of `term`.
+    A match inside one token is found with the term's own pattern; across
+    tokens the first token ends with, and the last starts with, its piece.
+    """
+    single = re.compile(_term_pattern(term)).search
+    phrases = []
+    for spelling in _spellings(term):
+        pieces = TOKEN.findall(spelling)
+        if len(pieces) == 1:
+            phrases.append([single])
+            continue
+        first, *middle, last = pieces
+        phrases.append([lambda t, p=first: t.endswith(p)]
+                       + [lambda t, p=p: t == p for p in middle]
+                       + [lambda t, p=last: t.startswith(p)])
+    return phrases
+
+
+GATE_PHRASES = [slots for term in GATE_TERMS for slots in _slot_predicates(term)]
+
+
+def index_candidates(index):
+    """NCT IDs of indexed trials that may mention a gate term (superset of the regex)."""
+    candidates = set()
+    for slots in GATE_PHRASES:
+        candidates |= index.matches([index.terms_where(p) for p in slots]).keys()
+    return candidates
+
+
+class GateStats:
+    """Counts gate decisions for the end-of-run log line."""
+
+    def __init__(self, index=None):
+        self.checked = 0
+        self.skipped = 0
+        self.index = index
+        self.candidates = index_candidates(index) if index is not None else None
+        self.from_index = 0
+
+    def check(self, text, nct_id=None):
+        self.checked += 1
+        if (self.candidates is not None and nct_id not in self.candidates
+                and self.index.is_current(nct_id, text)):
+            self.from_index += 1
+        elif mentions_target(text):
+            return True
+        self.skipped += 1
+        return False
+
+    def skip_rate(self):
+        return self.skipped / self.checked if self.checked else 0
+
+    def summary(self):
+        line = (f"Relevance gate: skipped {self.skipped}/{self.checked} trials "
+                f"({self.skip_rate():.1%}) without an LLM call")
+        if self.candidates is not None:
+            line += f", {self.from_index} decided by the text index alone"
+        return line
+
+
+
+### ============================================================
+###  PART 3 — GOLD-STANDARD AUDIT
+### ============================================================
+
+def flatten(lst):
+    out = []
+    for x in lst:
+        if isinstance(x, list):
+            out.extend(x)
+        else:
+            out.append(x)
+    return out
+
+
+def audit(raw, gs, index=None):
+    """`raw`: (nct_id, entry) pairs, `gs`: gold standard dict, `index`: optional TextIndex."""
+    stats = GateStats(index)
+    gold_total = 0
+    missed = {}
+
+    for nct_id, entry in raw:
+        passed = stats.check(entry.get("document", ""), nct_id)
+
+        item = gs.get(nct_id, {})
+        gold = [x for x in flatten(item.get("inclusion_biomarker", [])) +
+                flatten(item.get("exclusion_biomarker", [])) if is_target(x)]
+        gold_total += len(gold)
+        if not passed and gold:
+            missed[nct_id] = gold
+
+    print(stats.summary())
+    print(f"Gate vocabulary: {', '.join(GATE_TERMS)}")
+    n_missed = sum(len(v) for v in missed.values())
+    print(f"Gold HER2/BRCA biomarkers: {gold_total}, in skipped trials: {n_missed}")
+    for nct_id, terms in missed.items():
+        print(f"  missed {nct_id}: {terms}")
+
+    return stats, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the relevance gate on the gold standard")
+    parser.add_argument("--raw", default=RAW_FILE)
+    parser.add_argument("--gs", default=GS_FILE)
+    parser.add_argument("--index", default=None,
+                        help="text index of --raw (common/text_index.py) to take candidates from")
+    args = parser.parse_args()
+
+    # raw documents are streamed; the gold standard is looked up per trial
+    index = TextIndex(args.index) if args.index else None
+    audit(iter_trials(args.raw), dict(iter_trials(args.gs)), index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Multi-trial Request Packing
+------------------------------------------
+Bins several short trials (or candidate windows) into one prompt so the
+fixed extraction instructions are paid once per bin instead of per trial.
+
+1. `plan_bins()` greedily fills bins in input order up to a prompt token
+   budget (local tokenizer estimate, see token_counter.py) and a maximum
+   number of trials per bin; a trial that does not fit alone gets its own
+   single-trial request
+2. The packed prompt (biomarker_extraction_1shot_packed.txt) asks for one
+   JSON object keyed by NCT ID
+3. `split_packed()` demultiplexes the answer into per-trial results; a
+   missing or malformed sub-result falls back to a single-trial request
+   with the normal 1-shot prompt
+4. Trials whose single-trial request also fails are not written; their
+   NCT IDs are returned in `stats["failed"]` for a `--resume` run
+
+Bins run on the same bounded asyncio worker pool / response cache as the
+async extraction mode; a packed answer is cached only once it splits
+cleanly, so a malformed one is re-requested on the next run.
+"""
+
+import asyncio
+import json
+import time
+
+from openai import AsyncOpenAI
+
+from extraction_engine import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    MODEL,
+    TEMPERATURE,
+    complete,
+    make_rate_controller,
+    parse_output,
+    render_prompt,
+    to_result)
+from response_cache import cache_key
+from token_counter import count_tokens
+
+
+DEFAULT_BUDGET = 6000  # prompt tokens per packed request
+DEFAULT_MAX_TRIALS = 10
+
+RESULT_KEYS = ("inclusion_biomarker", "exclusion_biomarker")
+
+
+
+### ============================================================
+###  PART 1 — BIN PLANNING
+### ============================================================
+
+def trial_block(nct_id, text):
+    return f"### {nct_id}\n{text}"
+
+
+def render_packed(template, bin_trials):
+    blocks = "\n\n".join(trial_block(nct_id, text) for nct_id, text in bin_trials)
+    return template.replace("{{trials}}", blocks)
+
+
+def plan_bins(trials, template, budget=DEFAULT_BUDGET, max_trials=DEFAULT_MAX_TRIALS, model=MODEL):
+    """
+    Yield lists of (nct_id, text) whose packed prompt stays within `budget`.
+
+    Bins are filled in input order, so the planner works on a stream.
+    """
+    overhead = count_tokens(template.replace("{{trials}}", ""), model)
+    current, used = [], overhead
+
+    for nct_id, text in trials:
+        cost = count_tokens(trial_block(nct_id, text), model) + 2
+        if current and (used + cost > budget or len(current) >= max_trials):
+            yield current
+            current, used = [], overhead
+        current.append((nct_id, text))
+        used += cost
+
+    if current:
+        yield current
+
+
+
+### ============================================================
+###  PART 2 — DEMULTIPLEXING
+### ============================================================
+
+def _valid_sub_result(value):
+    return (
+        isinstance(value, dict)
+        and all(isinstance(value.get(k, []), list) for k in RESULT_KEYS)
+    )
+
+
+def split_packed(raw_output, nct_ids):
+    """
+    Split a packed answer into ({nct_id: parsed}, [nct_ids needing fallback]).
+    """
+    try:
+        parsed = json.loads(raw_output)
+    except (TypeError, ValueError):
+        parsed = None
+
+    if not isinstance(parsed, dict):
+        return {}, list(nct_ids)
+
+    results, fallback = {}, []
+    for nct_id in nct_ids:
+        value = parsed.get(nct_id)
+        if _valid_sub_result(value):
+            results[nct_id] = {k: value.get(k, []) for k in RESULT_KEYS}
+        else:
+            fallback.append(nct_id)
+    return results, fallback
+
+
+
+### ============================================================
+###  PART 3 — PACKED WORKER POOL
+### ============================================================
+
+async def _cached_complete(client, prompt, model, timeout, cache, rate, store=True):
+    """
+    (raw answer, from_cache) for `prompt`; with store=False a fresh answer
+    is not cached (the caller validates it first).
+    """
+    key = cache_key(prompt, model, TEMPERATURE)
+    raw_output = cache.get(key) if cache is not None else None
+    if raw_output is not None:
+        return raw_output, True
+    raw_output = await complete(client, prompt, model, timeout, rate)
+    if cache is not None and store:
+        cache.put(key, raw_output, model)
+    return raw_output, False
+
+
+async def _single(client, template, nct_id, text, model, timeout, cache, rate, stats):
+    """Parsed single-trial result, or None if the request failed."""
+    stats["single_requests"] += 1
+    try:
+        raw_output, _ = await _cached_complete(
+            client, render_prompt(template, text), model, timeout, cache, rate)
+    except Exception as e:
+        print(f"Failed → {nct_id}: {e}")
+        stats["errors"] += 1
+        return None
+    return parse_output(raw_output)
+
+
+async def _packed_worker(queue, client, packed_template, single_template, model, timeout,
+                         cache, rate, on_result, stats):
+    while True:
+        bin_trials = await queue.get()
+        if bin_trials is None:
+            queue.task_done()
+            return
+
+        texts = dict(bin_trials)
+        nct_ids = [nct_id for nct_id, _ in bin_trials]
+
+        if len(bin_trials) == 1:
+            results, fallback = {}, nct_ids
+        else:
+            prompt = render_packed(packed_template, bin_trials)
+            try:
+                raw_output, from_cache = await _cached_complete(
+                    client, prompt, model, timeout, cache, rate, store=False)
+            except Exception as e:
+                print(f"Packed request failed ({len(nct_ids)} trials): {e}")
+                stats["errors"] += 1
+                raw_output, from_cache = None, False
+            stats["packed_requests"] += 1
+            results, fallback = split_packed(raw_output, nct_ids)
+            stats["fallbacks"] += len(fallback)
+            # only a fresh, cleanly demultiplexed answer is worth serving again
+            if cache is not None and raw_output is not None and not from_cache and not fallback:
+                cache.put(cache_key(prompt, model, TEMPERATURE), raw_output, model)
+
+        for nct_id in fallback:
+            results[nct_id] = await _single(
+                client, single_template, nct_id, texts[nct_id], model, timeout, cache, rate, stats)
+
+        for nct_id in nct_ids:
+            if results[nct_id] is None:
+                stats["failed"].append(nct_id)
+                continue
+            on_result(to_result(nct_id, results[nct_id]))
+            stats["done"] += 1
+        print(f"Extracted bin of {len(nct_ids)} ({stats['done']})")
+        queue.task_done()
+
+
+async def extract_packed_async(trials, packed_template, single_template, model=MODEL,
+                               budget=DEFAULT_BUDGET, max_trials=DEFAULT_MAX_TRIALS,
+                               concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                               base_url=None, client=None, cache=None, rate=None, on_result=None):
+    """
+    Packed counterpart of `extract_all_async`: same arguments plus the
+    packed prompt template and bin limits; results go to `on_result`.
+    """
+    if client is None:
+        client = AsyncOpenAI(base_url=base_url, max_retries=0)
+    if rate is None:
+        rate = make_rate_controller(concurrency)
+
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    stats = {"done": 0, "packed_requests": 0, "single_requests": 0,
+             "fallbacks": 0, "errors": 0, "failed": []}
+
+    workers = [
+        asyncio.create_task(_packed_worker(queue, client, packed_template, single_template,
+                                           model, timeout, cache, rate, on_result, stats))
+        for _ in range(concurrency)
+    ]
+
+    start = time.time()
+    for bin_trials in plan_bins(trials, packed_template, budget, max_trials, model):
+        await queue.put(bin_trials)
+    for _ in workers:
+        await queue.put(None)
+
+    await asyncio.gather(*workers)
+    stats["seconds"] = time.time() - start
+    return stats
+
+
+def extract_packed(trials, packed_template, single_template, **kwargs):
+    """Synchronous entry point around `extract_packed_async`."""
+    return asyncio.run(extract_packed_async(trials, packed_template, single_template, **kwargs))
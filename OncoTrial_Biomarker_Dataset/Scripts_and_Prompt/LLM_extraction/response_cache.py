@@ -0,0 +1,139 @@
+"""
+LLM Response Cache
+------------------------------------------
+Persistent, content-addressed cache for chat completion responses.
+
+1. Key = SHA-256 of the fully rendered prompt plus model parameters
+   (model, temperature), so any template or trial-text change is a miss
+2. Stored in a single SQLite file next to the extraction results
+3. Size-bounded: least-recently-used entries are evicted once the total
+   stored response size exceeds `max_bytes`
+4. Hit / miss / eviction counters for the end-of-run report
+
+With temperature=0, re-running an unchanged extraction or evaluation is
+answered entirely from the cache.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB of stored responses
+
+
+def cache_key(prompt, model, temperature=0, **params):
+    """Content address for one rendered request."""
+    payload = {"model": model, "temperature": temperature, "prompt": prompt}
+    payload.update(params)
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of raw model responses."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.conn = None
+
+        if not enabled:
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)"
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key):
+        """Return the cached response for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        row = self.conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        self.conn.execute(
+            "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self.conn.commit()
+        return row[0]
+
+    def put(self, key, response, model=None):
+        """Store a response and evict LRU entries past the size bound."""
+        if not self.enabled or response is None:
+            return
+
+        size = len(response.encode("utf-8"))
+        old = self.conn.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if old is not None:
+            self.total_bytes -= old[0]
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, size, last_access) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, model, response, size, time.time())
+        )
+        self.total_bytes += size
+        self.stats["writes"] += 1
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.stats["evictions"] += 1
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0
+
+    def summary(self):
+        if not self.enabled:
+            return "Response cache: bypassed"
+        return (f"Response cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                f"(hit rate {self.hit_rate():.1%}), {self.stats['writes']} writes, "
+                f"{self.stats['evictions']} evictions, {self.total_bytes / 1e6:.1f} MB stored")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,88 @@
+"""
+Streaming Extraction Results
+------------------------------------------
+Append-only JSONL checkpoint for extraction runs.
+
+1. Every finished trial is written as one JSON line and flushed at once,
+   so a crash loses at most the trial that was in flight
+2. `done_ids()` lists NCT IDs already present, for resuming a run
+3. `iter_results()` reads the checkpoint back; a truncated last line from
+   a crash is skipped and the latest record per NCT ID wins
+
+`convert_jsonl_to_results.py` turns the checkpoint into the
+gpt-4.0-turbo_1shot.json layout used by the evaluation scripts.
+"""
+
+import json
+import os
+
+
+class ResultWriter:
+    """Append-only JSONL writer, one flushed line per trial."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.count = 0
+        self.written = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume and os.path.exists(path):
+            self.f = open(path, "a+", encoding="utf-8")
+            self._terminate_partial_line()
+        else:
+            self.f = open(path, "w", encoding="utf-8")
+
+    def _terminate_partial_line(self):
+        """Make sure appended records never glue onto a crash-truncated line."""
+        if self.f.tell() == 0:
+            return
+        self.f.seek(self.f.tell() - 1)
+        if self.f.read(1) != "\n":
+            self.f.write("\n")
+
+    def write(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.count += 1
+        self.written.add(record.get("nct_id"))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _iter_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # truncated line from an interrupted run
+                continue
+
+
+def done_ids(path):
+    """NCT IDs already present in a checkpoint file."""
+    if not os.path.exists(path):
+        return set()
+    return {record["nct_id"] for record in _iter_lines(path) if "nct_id" in record}
+
+
+def iter_results(path):
+    """Checkpoint records in first-seen order, latest record per NCT ID."""
+    latest = {}
+    for record in _iter_lines(path):
+        if "nct_id" in record:
+            latest[record["nct_id"]] = record
+    return iter(latest.values())
@@ -0,0 +1,32 @@
+"""
+Local token estimates for prompt planning.
+
+Uses the tiktoken encoding of the extraction model when tiktoken is
+installed, otherwise falls back to the usual ~4 characters per token.
+"""
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+_encodings = {}
+
+
+def _encoding(model):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Number of prompt tokens `text` costs for `model`."""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    return len(_encoding(model).encode(text))
@@ -1,14 +1,17 @@
 import json
+import os
+import sys
 from collections import Counter
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_trials
+
 INPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/gpt-4.0-turbo_1shot.json"
 OUTPUT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM_extraction/biomarker_aggregate.json"
 
-data = json.load(open(INPUT))
-
 counter = Counter()
 
-for item in data:
+for _, item in iter_trials(INPUT):
     for x in item["inclusion_biomarker"]:
         counter[x.strip().lower()] += 1
     for x in item["exclusion_biomarker"]:
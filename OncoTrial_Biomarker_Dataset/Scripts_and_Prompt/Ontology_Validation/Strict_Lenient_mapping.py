@@ -6,18 +6,49 @@ This script performs ontology mapping for extracted biomarkers using:
 2. Canonical term standardization (maps HER2/BRCA variants to NCIt canonical forms)
 3. UMLS search (exact + fuzzy)
 4. NCIt search (exact + fuzzy)
+   (answered from the offline index built by ontology_index.py when
+   ONTOLOGY_INDEX points at one, otherwise from the live REST APIs through
+   a pooled keep-alive session and a persistent TTL cache of search results)
 5. Strict mapping (exact canonical match only)
-6. Lenient mapping (fuzzy substring match)
+6. Lenient mapping (fuzzy substring match); with the offline index, terms
+   without a lenient match get a second try against the top-k trigram
+   neighbours of the whole vocabulary (ONTOLOGY_FUZZY_K, 0 = off;
+   ONTOLOGY_FUZZY_SOURCES, default NCIt); with a hierarchy index
+   (common/ontology_hierarchy.py), a term still unmatched falls back to the
+   closest ancestor of its search hits that another term mapped to
 
 Strict results reflect high-confidence matches.
 Lenient results improve coverage for downstream evaluation.
+The in-scope gold-standard terms are mapped in the same run (lenient) and
+written to mapped_gold_lenient.json, so the lenient evaluation can compare
+gold and predicted concepts in the ontology hierarchy.
+
+Raw terms are grouped by normalized form first, so every equivalence class
+("brca1 mutation (germline)" / "brca1 mutation (somatic)" → "brca1 gene
+mutation") is searched and matched once and fanned back out to its members.
+Lookups run on a thread pool (ONTOLOGY_MAP_WORKERS, default 8; 1 = serial)
+with the UMLS and NCIt searches of a term in flight together; the API rate
+caps are shared by all workers and results are written in input order.
 """
 
 import json
 import requests
-import time
+from requests.adapters import HTTPAdapter
 import os
-import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.vocabulary import GENE_ALIASES
+from common.json_stream import iter_trials
+from common.normalization import BiomarkerNormalizer
+from common.ontology_hierarchy import OntologyHierarchy
+from common.target_matcher import is_target
+from common.rate_control import RateController
+from ontology_index import INDEX_FILE, OntologyIndex
+from rest_cache import RestCache, rest_key
 
 
 ### ============================================================
@@ -29,21 +60,70 @@ INPUT_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/LLM
 OUT_STRICT  = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_strict.json"
 OUT_LENIENT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_lenient.json"
 
+# Gold-standard terms, mapped alongside for the hierarchical lenient evaluation
+GOLD_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Datasets/Golden_standard/random_trials_annotated.json"
+OUT_GOLD_LENIENT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/mapped_gold_lenient.json"
+
 UMLS_API_KEY = os.getenv("UMLS_API_KEY")
 UMLS_VERSION = os.getenv("UMLS_VERSION", "current")
 
+MAP_WORKERS = int(os.getenv("ONTOLOGY_MAP_WORKERS", "8"))
+
+# Requests/second caps shared by all workers; retry/backoff on 429/5xx/timeouts
+# (common/rate_control.py)
+UMLS_RATE = RateController(rate=float(os.getenv("UMLS_API_RATE", "8")), concurrency=MAP_WORKERS, name="UMLS")
+NCIT_RATE = RateController(rate=float(os.getenv("NCIT_API_RATE", "8")), concurrency=MAP_WORKERS, name="NCIt")
+
+# Offline UMLS / NCIt index (ontology_index.py); live APIs are used when it is missing
+ONTOLOGY_INDEX = os.getenv("ONTOLOGY_INDEX", INDEX_FILE)
+LOCAL_INDEX = OntologyIndex(ONTOLOGY_INDEX) if os.path.exists(ONTOLOGY_INDEX) else None
+FUZZY_TOP_K = int(os.getenv("ONTOLOGY_FUZZY_K", "10"))
+FUZZY_SOURCES = os.getenv("ONTOLOGY_FUZZY_SOURCES", "NCIt").split(",")
+
+# Optional is-a hierarchies for the nearest-mapped-ancestor fallback
+HIERARCHY_FILES = {
+    "NCIt": "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/ncit_hierarchy.npz",
+    "UMLS": "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/umls_hierarchy.npz"
+}
+
+# Persistent cache of live search results, keyed by endpoint + version + term
+REST_CACHE_FILE = os.getenv(
+    "ONTOLOGY_CACHE_FILE",
+    "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/ontology_search_cache.sqlite")
+REST_CACHE_TTL_DAYS = float(os.getenv("ONTOLOGY_CACHE_TTL_DAYS", "30"))
+
+# The cache file and the HTTP session are created on first live search, so
+# importing this module (or running on the offline index) touches no files
+_rest_cache = None
+_session = None
+_lazy_lock = threading.Lock()
+
+
+def rest_cache():
+    global _rest_cache
+    with _lazy_lock:
+        if _rest_cache is None:
+            _rest_cache = RestCache(REST_CACHE_FILE, ttl=REST_CACHE_TTL_DAYS * 24 * 3600,
+                                    enabled=os.getenv("ONTOLOGY_CACHE", "1") != "0")
+        return _rest_cache
+
+
+def http_session():
+    """One keep-alive connection pool per host instead of a new connection per request."""
+    global _session
+    with _lazy_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=max(16, MAP_WORKERS)))
+        return _session
+
 
 
 ### ============================================================
 ###  PART 1 — NORMALIZATION + CANONICAL MAPPING
 ### ============================================================
 
-GENE_ALIASES = {
-    "her2": "erbb2",
-    "neu": "erbb2",
-    "brca-1": "brca1",
-    "brca-2": "brca2"
-}
+# Gene aliases (her2/neu → erbb2, ...) come from common/vocabulary.py
 
 # Canonical NCIt-standard terms
 CANONICAL_MAP = {
@@ -80,29 +160,13 @@ CANONICAL_MAP = {
 }
 
 
-def normalize_biomarker(term):
-    """Normalize and canonicalize biomarker terminology."""
-
-    t = term.lower().strip()
-
-    # Remove text inside parentheses
-    t = re.sub(r"\(.*?\)", "", t).strip()
-
-    # Normalize unicode dashes
-    t = t.replace("–", "-").replace("—", "-")
+# Compiled, memoized cleanup + alias substitution (common/normalization.py)
+NORMALIZER = BiomarkerNormalizer(GENE_ALIASES, CANONICAL_MAP)
 
-    # Normalize whitespace
-    t = re.sub(r"\s+", " ", t)
 
-    # Normalize gene aliases
-    for k, v in GENE_ALIASES.items():
-        t = t.replace(k, v)
-
-    # Canonical mapping
-    if t in CANONICAL_MAP:
-        t = CANONICAL_MAP[t]
-
-    return t.strip()
+def normalize_biomarker(term):
+    """Normalize and canonicalize biomarker terminology."""
+    return NORMALIZER(term)
 
 
 
@@ -112,6 +176,15 @@ def normalize_biomarker(term):
 
 def umls_search(term):
     """UMLS search with word-based matching."""
+    if LOCAL_INDEX is not None:
+        return LOCAL_INDEX.umls_search(term)
+
+    cache = rest_cache()
+    key = rest_key("umls/search", UMLS_VERSION, term)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
     url = f"https://uts-ws.nlm.nih.gov/rest/search/{UMLS_VERSION}"
     params = {
         "string": term,
@@ -120,27 +193,42 @@ def umls_search(term):
     }
 
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = UMLS_RATE.call(http_session().get, url, params=params, timeout=10)
         if r.status_code != 200:
             return []
-        return r.json().get("result", {}).get("results", [])
+        results = r.json().get("result", {}).get("results", [])
     except:
         return []
 
+    cache.put(key, results, "umls/search", term)
+    return results
+
 
 def ncit_search(term):
     """NCIt EVS REST API search."""
+    if LOCAL_INDEX is not None:
+        return LOCAL_INDEX.ncit_search(term)
+
+    cache = rest_cache()
+    key = rest_key("ncit/concepts/search", None, term)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
     url = "https://api-evsrest.nci.nih.gov/api/v1/concepts/search"
     params = {"keyword": term}
 
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = NCIT_RATE.call(http_session().get, url, params=params, timeout=10)
         if r.status_code != 200:
             return []
-        return r.json().get("concepts", [])
+        results = r.json().get("concepts", [])
     except:
         return []
 
+    cache.put(key, results, "ncit/concepts/search", term)
+    return results
+
 
 
 ### ============================================================
@@ -206,31 +294,171 @@ def lenient_match(normalized, umls_results, ncit_results):
 ###  PART 4 — MAIN PIPELINE
 ### ============================================================
 
-def main():
-    biomarkers = json.load(open(INPUT_FILE))
-    mapped_strict = {}
-    mapped_lenient = {}
+def fuzzy_candidates(normalized):
+    """Extra (umls, ncit) lenient candidates from the offline index's trigram search."""
+    if LOCAL_INDEX is None or FUZZY_TOP_K <= 0:
+        return [], []
+    umls = LOCAL_INDEX.umls_fuzzy(normalized, FUZZY_TOP_K) if "UMLS" in FUZZY_SOURCES else []
+    ncit = LOCAL_INDEX.ncit_fuzzy(normalized, FUZZY_TOP_K) if "NCIt" in FUZZY_SOURCES else []
+    return umls, ncit
+
+
+def search_all(normalized_terms, workers=MAP_WORKERS):
+    """
+    Yield (umls_results, ncit_results) per normalized term, in input order.
+
+    With workers > 1 both searches of every term are submitted to one
+    thread pool up front, so UMLS and NCIt calls overlap across terms.
+    """
+    if workers <= 1:
+        for normalized in normalized_terms:
+            yield umls_search(normalized), ncit_search(normalized)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (pool.submit(umls_search, n), pool.submit(ncit_search, n))
+            for n in normalized_terms
+        ]
+        for umls_future, ncit_future in futures:
+            yield umls_future.result(), ncit_future.result()
+
+
+def hit_codes(umls_results, ncit_results):
+    """(ontology, code) of every search hit, in result order."""
+    return ([("UMLS", r["ui"]) for r in umls_results if r.get("ui")]
+            + [("NCIt", c["code"]) for c in ncit_results if c.get("code")])
+
+
+def ancestor_match(hits, mapped, hierarchies):
+    """
+    Lenient fallback: the mapped concept closest above any search hit.
+
+    `mapped` is {ontology: {code: match}} of the concepts other terms
+    mapped to; the nearest ancestor wins, earlier hits break ties.
+    """
+    best = None
+    for ontology, code in hits:
+        if ontology not in hierarchies or not mapped.get(ontology):
+            continue
+        found = hierarchies[ontology].nearest_mapped_ancestor(code, mapped[ontology])
+        if found is not None and (best is None or found[1] < best[2]):
+            best = (ontology, found[0], found[1])
+    if best is None:
+        return None
+
+    ontology, code, _ = best
+    return dict(mapped[ontology][code], match_type="lenient_ancestor")
+
+
+def flatten(lst):
+    out = []
+    for x in lst:
+        if isinstance(x, list):
+            out.extend(x)
+        else:
+            out.append(x)
+    return out
+
+
+def gold_terms(path=GOLD_FILE):
+    """In-scope gold-standard terms (lowercased, first-seen order); [] without the file."""
+    if not os.path.exists(path):
+        return []
+    terms = {}
+    for _, item in iter_trials(path):
+        for x in flatten(item.get("inclusion_biomarker", [])) + flatten(item.get("exclusion_biomarker", [])):
+            if is_target(x):
+                terms.setdefault(x.lower(), None)
+    return list(terms)
 
-    print(f"\nTotal biomarkers to map: {len(biomarkers)}\n")
 
+def group_by_normalized(biomarkers):
+    """{normalized form: [raw terms]} in first-seen order."""
+    classes = {}
     for b in biomarkers:
+        classes.setdefault(normalize_biomarker(b), []).append(b)
+    return classes
 
-        normalized = normalize_biomarker(b)
-        print(f"\n→ Mapping: \"{b}\" → normalized: \"{normalized}\"")
-
-        umls_results = umls_search(normalized)
-        ncit_results = ncit_search(normalized)
 
-        mapped_strict[b] = strict_match(normalized, umls_results, ncit_results)
-        mapped_lenient[b] = lenient_match(normalized, umls_results, ncit_results)
+def main():
+    biomarkers = json.load(open(INPUT_FILE))
+    gold = gold_terms()
+    mapped_strict = {}
+    mapped_lenient = {}
 
-        time.sleep(0.25)  # rate limit protection
+    print(f"\nTotal biomarkers to map: {len(biomarkers)} (+ {len(gold)} gold-standard terms)\n")
+    workers = 1 if LOCAL_INDEX is not None else MAP_WORKERS
+    if LOCAL_INDEX is not None:
+        print(f"Using offline ontology index: {ONTOLOGY_INDEX}\n")
+
+    start = time.time()
+    # gold terms join the equivalence classes, so shared forms are searched once
+    terms = list(dict.fromkeys([*biomarkers, *gold]))
+    classes = group_by_normalized(terms)
+    saved = len(terms) - len(classes)
+    print(f"Equivalence classes: {len(classes)} normalized forms for {len(terms)} raw terms "
+          f"(dedupe ratio {len(terms) / max(1, len(classes)):.2f}x, "
+          f"{2 * saved} UMLS/NCIt calls saved)")
+
+    results = search_all(list(classes), workers)
+    unmatched = {}
+
+    for (normalized, members), (umls_results, ncit_results) in zip(classes.items(), results):
+
+        strict = strict_match(normalized, umls_results, ncit_results)
+        lenient = lenient_match(normalized, umls_results, ncit_results)
+        if lenient is None:
+            fuzzy = fuzzy_candidates(normalized)
+            lenient = lenient_match(normalized, *fuzzy)
+            if lenient is None:
+                unmatched[normalized] = hit_codes(umls_results, ncit_results) + hit_codes(*fuzzy)
+
+        for b in members:
+            print(f"\n→ Mapping: \"{b}\" → normalized: \"{normalized}\"")
+            mapped_strict[b] = strict
+            mapped_lenient[b] = lenient
+
+    # nearest mapped ancestor, once every class has had its own lookup
+    hierarchies = {
+        name: OntologyHierarchy.load(path)
+        for name, path in HIERARCHY_FILES.items() if os.path.exists(path)
+    }
+    if hierarchies and unmatched:
+        mapped = {}
+        for m in mapped_lenient.values():
+            if m is not None:
+                mapped.setdefault(m["ontology"], {}).setdefault(m["code"], m)
+        fallbacks = 0
+        for normalized, hits in unmatched.items():
+            lenient = ancestor_match(hits, mapped, hierarchies)
+            if lenient is not None:
+                fallbacks += 1
+                for b in classes[normalized]:
+                    mapped_lenient[b] = lenient
+        print(f"Ancestor fallback ({', '.join(hierarchies)}): "
+              f"{fallbacks} of {len(unmatched)} unmatched forms")
+
+    # input order, as before; the gold map is read before narrowing to the aggregate
+    gold_lenient = {g: mapped_lenient[g] for g in gold}
+    mapped_strict = {b: mapped_strict[b] for b in biomarkers}
+    mapped_lenient = {b: mapped_lenient[b] for b in biomarkers}
 
     json.dump(mapped_strict, open(OUT_STRICT, "w"), indent=2)
     json.dump(mapped_lenient, open(OUT_LENIENT, "w"), indent=2)
+    if gold:
+        json.dump(gold_lenient, open(OUT_GOLD_LENIENT, "w"), indent=2)
 
     print("\n✓ Strict mapping saved:", OUT_STRICT)
     print("✓ Lenient mapping saved:", OUT_LENIENT)
+    if gold:
+        print("✓ Gold-standard lenient mapping saved:", OUT_GOLD_LENIENT)
+    print(f"Mapped {len(terms)} terms ({len(classes)} lookups) in "
+          f"{time.time() - start:.1f}s ({workers} workers)")
+    if LOCAL_INDEX is None:
+        print(rest_cache().summary())
+        print(UMLS_RATE.summary())
+        print(NCIT_RATE.summary())
 
 
 
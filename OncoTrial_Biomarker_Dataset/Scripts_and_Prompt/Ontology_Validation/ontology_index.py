@@ -0,0 +1,337 @@
+"""
+Offline Ontology Index
+------------------------------------------
+Local replacement for the live UMLS / NCIt search used by
+Strict_Lenient_mapping.py.
+
+1. Importers stream the UMLS Metathesaurus MRCONSO.RRF and the NCIt flat
+   export (Thesaurus.txt) or OWL export (Thesaurus.owl) into one SQLite file
+2. Every concept string is stored under a normalized key (lowercase,
+   unicode dashes folded, whitespace collapsed) plus a word index
+3. `umls_search()` / `ncit_search()` answer like the REST "words" search:
+   concepts having a string that contains every word of the query, exact
+   key matches first; results carry the REST shapes ({"ui", "name"} and
+   {"code", "preferredName"}) that strict_match() / lenient_match() read
+4. `umls_fuzzy()` / `ncit_fuzzy()` return the top-k concepts by character
+   trigram similarity of their names (common/fuzzy_index.py), substring
+   matches first, as extra lenient candidates; the trigram index of a
+   source is built in memory on first use
+
+Build once, then point ONTOLOGY_INDEX at the file:
+
+    python ontology_index.py --mrconso MRCONSO.RRF --ncit Thesaurus.txt \
+        --output ontology_index.sqlite
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.fuzzy_index import TrigramIndex
+
+
+### ============================================================
+###  CONFIG
+### ============================================================
+
+INDEX_FILE = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets/Results/Ontology_Validation/ontology_index.sqlite"
+
+MAX_RESULTS = 25  # same as the REST page size
+FUZZY_TOP_K = 10
+BATCH_SIZE = 50000
+
+WORD = re.compile(r"[a-z0-9]+")
+DASHES = str.maketrans({"–": "-", "—": "-", "‐": "-", "‑": "-"})
+
+# NCIt OWL properties: P108 = Preferred_Name, P90 = FULL_SYN
+OWL_CLASS = "{http://www.w3.org/2002/07/owl#}Class"
+RDF_ABOUT = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about"
+NCIT_NS = "{http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#}"
+
+
+def normalize_key(term):
+    """Lookup key for a concept string."""
+    return re.sub(r"\s+", " ", term.lower().translate(DASHES)).strip()
+
+
+def words_of(key):
+    return sorted(set(WORD.findall(key)))
+
+
+
+### ============================================================
+###  PART 1 — SOURCE READERS
+### ============================================================
+
+def read_mrconso(path, languages=("ENG",), sources=None):
+    """
+    Yield (cui, string, is_preferred) from MRCONSO.RRF.
+
+    Columns: CUI|LAT|TS|LUI|STT|SUI|ISPREF|AUI|SAUI|SCUI|SDUI|SAB|TTY|CODE|STR|SRL|SUPPRESS|CVF
+    Suppressed atoms (SUPPRESS = O/E/Y) are left out.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("|")
+            if len(cols) < 17:
+                continue
+            if languages and cols[1] not in languages:
+                continue
+            if sources and cols[11] not in sources:
+                continue
+            if cols[16] not in ("N", ""):
+                continue
+            preferred = cols[2] == "P" and cols[4] == "PF" and cols[6] == "Y"
+            yield cols[0], cols[14], preferred
+
+
+def read_ncit_flat(path):
+    """
+    Yield (code, preferred_name, synonyms) from the NCIt flat file.
+
+    Columns: code, concept IRI, parents, synonyms (|-separated, preferred
+    name first), definition, display name, concept status, semantic type
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 4:
+                continue
+            synonyms = [s for s in cols[3].split("|") if s]
+            if not synonyms:
+                continue
+            yield cols[0], synonyms[0], synonyms
+
+
+def read_ncit_owl(path):
+    """Yield (code, preferred_name, synonyms) from the NCIt OWL export."""
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag != OWL_CLASS:
+            continue
+
+        about = elem.get(RDF_ABOUT, "")
+        code = elem.findtext(NCIT_NS + "NHC0") or about.rsplit("#", 1)[-1]
+        preferred = elem.findtext(NCIT_NS + "P108")
+        synonyms = [s.text for s in elem.findall(NCIT_NS + "P90") if s.text]
+        elem.clear()
+
+        if not code or not (preferred or synonyms):
+            continue
+        preferred = preferred or synonyms[0]
+        yield code, preferred, [preferred] + synonyms
+
+
+def read_ncit(path):
+    if path.lower().endswith((".owl", ".xml")):
+        return read_ncit_owl(path)
+    return read_ncit_flat(path)
+
+
+
+### ============================================================
+###  PART 2 — BUILD
+### ============================================================
+
+SCHEMA = [
+    "CREATE TABLE concepts ("
+    " id INTEGER PRIMARY KEY,"
+    " source TEXT NOT NULL,"
+    " code TEXT NOT NULL,"
+    " name TEXT NOT NULL)",
+    "CREATE TABLE strings ("
+    " id INTEGER PRIMARY KEY,"
+    " concept_id INTEGER NOT NULL,"
+    " key TEXT NOT NULL)",
+    "CREATE TABLE words ("
+    " word TEXT NOT NULL,"
+    " string_id INTEGER NOT NULL)",
+]
+
+INDEXES = [
+    "CREATE UNIQUE INDEX idx_concept ON concepts (source, code)",
+    "CREATE INDEX idx_string_key ON strings (key)",
+    "CREATE INDEX idx_word ON words (word, string_id)",
+]
+
+
+class _Builder:
+    def __init__(self, conn):
+        self.conn = conn
+        self.concepts = {}
+        self.seen = set()  # (concept id, key) over the whole build, not per batch
+        self.string_id = 0
+        self.strings, self.words = [], []
+
+    def concept(self, source, code, name):
+        cid = self.concepts.get((source, code))
+        if cid is None:
+            cid = len(self.concepts) + 1
+            self.concepts[(source, code)] = cid
+            self.conn.execute("INSERT INTO concepts VALUES (?, ?, ?, ?)", (cid, source, code, name))
+        return cid
+
+    def add_string(self, cid, term):
+        key = normalize_key(term)
+        if not key or (cid, key) in self.seen:
+            return
+        self.seen.add((cid, key))
+
+        self.string_id += 1
+        self.strings.append((self.string_id, cid, key))
+        self.words.extend((w, self.string_id) for w in words_of(key))
+        if len(self.strings) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.conn.executemany("INSERT INTO strings VALUES (?, ?, ?)", self.strings)
+        self.conn.executemany("INSERT INTO words VALUES (?, ?)", self.words)
+        self.strings, self.words = [], []
+
+
+def build_index(output, mrconso=None, ncit=None, sources=None):
+    """Create the SQLite index from the given source files; return row counts."""
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(output):
+        os.remove(output)
+
+    conn = sqlite3.connect(output)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    builder = _Builder(conn)
+
+    if mrconso:
+        preferred = {}
+        for cui, string, is_preferred in read_mrconso(mrconso, sources=sources):
+            cid = builder.concept("UMLS", cui, string)
+            if is_preferred:
+                preferred[cid] = string
+            builder.add_string(cid, string)
+        builder.flush()
+        conn.executemany("UPDATE concepts SET name = ? WHERE id = ?",
+                         ((name, cid) for cid, name in preferred.items()))
+
+    if ncit:
+        for code, name, synonyms in read_ncit(ncit):
+            cid = builder.concept("NCIt", code, name)
+            for s in synonyms:
+                builder.add_string(cid, s)
+        builder.flush()
+
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("concepts", "strings", "words")
+    }
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
+
+
+
+### ============================================================
+###  PART 3 — SEARCH
+### ============================================================
+
+class OntologyIndex:
+    """Read-only word search over a built index, in the REST result shapes."""
+
+    def __init__(self, path=INDEX_FILE, max_results=MAX_RESULTS):
+        self.path = path
+        self.max_results = max_results
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.execute("PRAGMA query_only = ON")
+        self.conn.execute("PRAGMA mmap_size = 1073741824")
+        self.fuzzy = {}
+
+    def search(self, term, source):
+        """[(code, name)] for concepts of `source` with a string containing every query word."""
+        key = normalize_key(term)
+        words = words_of(key)
+        if not words:
+            return []
+
+        matching = " INTERSECT ".join(["SELECT string_id FROM words WHERE word = ?"] * len(words))
+        return self.conn.execute(
+            "SELECT c.code, c.name FROM strings s JOIN concepts c ON c.id = s.concept_id "
+            f"WHERE s.id IN ({matching}) AND c.source = ? "
+            "GROUP BY c.id ORDER BY MAX(s.key = ?) DESC, MIN(LENGTH(s.key)), c.code LIMIT ?",
+            (*words, source, key, self.max_results)
+        ).fetchall()
+
+    def lookup(self, term, source=None):
+        """[(source, code, name)] for concepts having exactly this normalized string."""
+        sql = ("SELECT c.source, c.code, c.name FROM strings s "
+               "JOIN concepts c ON c.id = s.concept_id WHERE s.key = ?")
+        params = [normalize_key(term)]
+        if source:
+            sql += " AND c.source = ?"
+            params.append(source)
+        return self.conn.execute(sql + " ORDER BY c.source, c.code", params).fetchall()
+
+    def fuzzy_search(self, term, source, k=FUZZY_TOP_K):
+        """[(code, name)] of the `k` concepts whose names are closest to `term`."""
+        if source not in self.fuzzy:
+            rows = self.conn.execute(
+                "SELECT code, name FROM concepts WHERE source = ? ORDER BY id", (source,)
+            ).fetchall()
+            self.fuzzy[source] = (rows, TrigramIndex(normalize_key(name) for _, name in rows))
+
+        rows, index = self.fuzzy[source]
+        return [rows[i] for i, _ in index.search(normalize_key(term), k)]
+
+    def umls_search(self, term):
+        return [{"ui": code, "name": name}
+                for code, name in self.search(term, "UMLS")]
+
+    def ncit_search(self, term):
+        return [{"code": code, "preferredName": name}
+                for code, name in self.search(term, "NCIt")]
+
+    def umls_fuzzy(self, term, k=FUZZY_TOP_K):
+        return [{"ui": code, "name": name} for code, name in self.fuzzy_search(term, "UMLS", k)]
+
+    def ncit_fuzzy(self, term, k=FUZZY_TOP_K):
+        return [{"code": code, "preferredName": name}
+                for code, name in self.fuzzy_search(term, "NCIt", k)]
+
+    def close(self):
+        self.conn.close()
+
+
+
+### ============================================================
+###  PART 4 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline UMLS / NCIt search index")
+    parser.add_argument("--mrconso", help="UMLS MRCONSO.RRF")
+    parser.add_argument("--ncit", help="NCIt flat file (Thesaurus.txt) or OWL export (Thesaurus.owl)")
+    parser.add_argument("--sab", nargs="*", help="only keep these UMLS source vocabularies (e.g. NCI MSH SNOMEDCT_US)")
+    parser.add_argument("--output", default=INDEX_FILE)
+    args = parser.parse_args()
+
+    if not args.mrconso and not args.ncit:
+        parser.error("give --mrconso and/or --ncit")
+
+    start = time.time()
+    counts = build_index(args.output, args.mrconso, args.ncit, set(args.sab) if args.sab else None)
+    print(f"Built {args.output} in {time.time() - start:.1f}s: "
+          f"{counts['concepts']} concepts, {counts['strings']} strings, {counts['words']} word postings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Ontology REST Response Cache
+------------------------------------------
+Persistent cache of UMLS / NCIt search results for Strict_Lenient_mapping.py.
+
+1. Key = SHA-256 of (endpoint, version, term), so a UMLS_VERSION change
+   or a different normalized term is a miss
+2. Stored in a single SQLite file next to the mapping results
+3. Entries older than `ttl` seconds are treated as misses and overwritten,
+   so ontology releases are picked up eventually
+4. Hit / miss / expiry counters for the end-of-run report
+
+Only successful (HTTP 200) searches are stored; failed lookups are retried
+on the next run. Safe to share between the mapping worker threads.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_TTL = 30 * 24 * 3600  # 30 days
+
+
+def rest_key(endpoint, version, term):
+    """Content address for one search request."""
+    blob = json.dumps([endpoint, version, term], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class RestCache:
+    """SQLite-backed TTL cache of decoded search results."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0}
+        self.conn = None
+        self.lock = threading.Lock()
+
+        if not enabled:
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            " key TEXT PRIMARY KEY,"
+            " endpoint TEXT,"
+            " term TEXT,"
+            " results TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached results for `key`, or None on a miss / expired entry."""
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results, created FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if time.time() - row[1] > self.ttl:
+                self.stats["expired"] += 1
+                return None
+            self.stats["hits"] += 1
+
+        return json.loads(row[0])
+
+    def put(self, key, results, endpoint=None, term=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO searches (key, endpoint, term, results, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, endpoint, term, json.dumps(results, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+            self.stats["writes"] += 1
+
+    def purge_expired(self):
+        """Delete expired entries; return how many were removed."""
+        if not self.enabled:
+            return 0
+        with self.lock:
+            cur = self.conn.execute(
+                "DELETE FROM searches WHERE created < ?", (time.time() - self.ttl,)
+            )
+            self.conn.commit()
+        return cur.rowcount
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["expired"]
+        return self.stats["hits"] / lookups if lookups else 0
+
+    def summary(self):
+        if not self.enabled:
+            return "Ontology search cache: bypassed"
+        return (f"Ontology search cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['expired']} expired (hit rate {self.hit_rate():.1%}), "
+                f"{self.stats['writes']} writes")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
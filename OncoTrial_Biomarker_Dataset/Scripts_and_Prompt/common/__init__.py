@@ -0,0 +1,5 @@
+"""
+Code shared by the LLM extraction, ontology validation and evaluation
+scripts. Scripts put `Scripts_and_Prompt/` on sys.path and import from
+`common.*`.
+"""
@@ -0,0 +1,193 @@
+"""
+Vectorized set-evaluation core
+------------------------------------------
+Shared TP / FP / FN and P / R / F1 computation for the evaluation scripts.
+
+1. `Interner` maps biomarker strings to integer ids (first-seen order)
+2. `TrialSets` holds one deduplicated id set per trial as a CSR matrix
+   (indptr + sorted ids per row)
+3. `confusion()` encodes every (trial, id) cell as one int64 key, so the
+   per-trial intersections of gold and predicted sets are a single
+   `np.intersect1d` plus a `np.bincount` over trial numbers;
+   `confusion_by_label()` bins the same cells by a per-term label instead
+4. `scores()` turns the per-trial counts into micro and macro P / R / F1
+
+`python -m common.eval_core` (from Scripts_and_Prompt/) times it on a
+synthetic run of millions of trial × run rows.
+"""
+
+import numpy as np
+
+
+### ============================================================
+###  PART 1 — INTERNING + CSR SETS
+### ============================================================
+
+class Interner:
+    """String ↔ integer id table."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def __len__(self):
+        return len(self.strings)
+
+    def id(self, term):
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.strings)
+            self.strings.append(term)
+        return i
+
+
+class TrialSets:
+    """One set of interned ids per trial, stored as CSR arrays."""
+
+    def __init__(self, indptr, indices, interner):
+        self.indptr = indptr
+        self.indices = indices
+        self.interner = interner
+
+    @classmethod
+    def from_lists(cls, rows, interner):
+        """Build from an iterable of per-trial term iterables (duplicates are dropped)."""
+        indptr = [0]
+        indices = []
+        for row in rows:
+            ids = sorted({interner.id(t) for t in row})
+            indices.extend(ids)
+            indptr.append(len(indices))
+        return cls(np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64), interner)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def sizes(self):
+        return np.diff(self.indptr)
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def terms(self, i):
+        return [self.interner.strings[j] for j in self.row(i)]
+
+    def keys(self, width):
+        """One int64 key per (trial, id) cell: trial * width + id (sorted, unique)."""
+        trials = np.repeat(np.arange(len(self), dtype=np.int64), self.sizes())
+        return trials * width + self.indices
+
+
+
+### ============================================================
+###  PART 2 — COUNTS + SCORES
+### ============================================================
+
+def confusion(gold, pred):
+    """Per-trial (tp, fp, fn) int arrays for aligned gold / predicted TrialSets."""
+    if len(gold) != len(pred):
+        raise ValueError(f"gold has {len(gold)} trials, predictions {len(pred)}")
+
+    width = max(len(gold.interner), len(pred.interner), 1)
+    shared = np.intersect1d(gold.keys(width), pred.keys(width), assume_unique=True)
+    tp = np.bincount(shared // width, minlength=len(gold))
+    return tp, pred.sizes() - tp, gold.sizes() - tp
+
+
+def confusion_by_label(gold, pred, labels, n_labels):
+    """
+    (tp, fp, fn) summed over all trials per term label, where `labels[id]`
+    is the label code (0 .. n_labels-1) of interned term `id`.
+    """
+    if len(gold) != len(pred):
+        raise ValueError(f"gold has {len(gold)} trials, predictions {len(pred)}")
+
+    width = max(len(gold.interner), len(pred.interner), 1)
+    gold_keys, pred_keys = gold.keys(width), pred.keys(width)
+    shared = np.intersect1d(gold_keys, pred_keys, assume_unique=True)
+    labels = np.asarray(labels, dtype=np.int64)
+
+    def count(keys):
+        return np.bincount(labels[keys % width], minlength=n_labels)
+
+    return (count(shared),
+            count(np.setdiff1d(pred_keys, shared, assume_unique=True)),
+            count(np.setdiff1d(gold_keys, shared, assume_unique=True)))
+
+
+def _prf(tp, fp, fn):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / np.maximum(tp + fp, 1), 0.0)
+        recall = np.where(tp + fn > 0, tp / np.maximum(tp + fn, 1), 0.0)
+        f1 = np.where(precision + recall > 0,
+                      2 * precision * recall / np.where(precision + recall > 0, precision + recall, 1), 0.0)
+    return precision, recall, f1
+
+
+def scores(tp, fp, fn):
+    """
+    Micro scores from the summed counts, macro scores as the mean over
+    trials that have any gold or predicted term.
+    """
+    TP, FP, FN = int(np.sum(tp)), int(np.sum(fp)), int(np.sum(fn))
+    precision = TP / (TP + FP) if TP + FP else 0
+    recall = TP / (TP + FN) if TP + FN else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+
+    active = (np.asarray(tp) + fp + fn) > 0
+    p, r, f = _prf(*(np.asarray(x, dtype=np.float64)[active] for x in (tp, fp, fn)))
+    return {
+        "TP": TP,
+        "FP": FP,
+        "FN": FN,
+        "Precision": precision,
+        "Recall": recall,
+        "F1": f1,
+        "Macro": {
+            "Precision": float(p.mean()) if len(p) else 0,
+            "Recall": float(r.mean()) if len(r) else 0,
+            "F1": float(f.mean()) if len(f) else 0,
+            "trials": int(active.sum())
+        }
+    }
+
+
+
+### ============================================================
+###  BENCHMARK
+### ============================================================
+
+def benchmark(n_rows=2_000_000, vocab=5000, seed=0):
+    import time
+
+    rng = np.random.default_rng(seed)
+    interner = Interner()
+    for i in range(vocab):
+        interner.id(f"term {i}")
+
+    row_starts = rng.integers(0, vocab - 16, n_rows)
+
+    def random_sets(shift):
+        sizes = rng.integers(0, 4, n_rows)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(sizes)
+        # distinct, sorted ids per row: every other id from a per-row start
+        starts = np.repeat(row_starts + 2 * shift, sizes)
+        within = np.arange(indptr[-1]) - np.repeat(indptr[:-1], sizes)
+        return TrialSets(indptr, starts + within * 2, interner)
+
+    # predictions start where gold does on half the rows, one slot later on the rest
+    gold = random_sets(0)
+    pred = random_sets(rng.integers(0, 2, n_rows))
+
+    start = time.perf_counter()
+    tp, fp, fn = confusion(gold, pred)
+    summary = scores(tp, fp, fn)
+    elapsed = time.perf_counter() - start
+
+    print(f"{n_rows} trial x run rows, {len(gold.indices)} gold / {len(pred.indices)} predicted terms: "
+          f"{elapsed:.2f}s (micro F1 {summary['F1']:.3f}, macro F1 {summary['Macro']['F1']:.3f})")
+
+
+if __name__ == "__main__":
+    benchmark()
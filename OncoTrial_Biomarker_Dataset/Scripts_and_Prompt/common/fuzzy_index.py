@@ -0,0 +1,110 @@
+"""
+Character-trigram fuzzy index
+------------------------------------------
+Inverted index from character trigrams to vocabulary strings, used for
+lenient (substring) ontology matching and the oracle mapping instead of
+comparing every query with every vocabulary string.
+
+1. Every string is indexed under its distinct trigrams (NumPy posting
+   arrays); strings shorter than 3 characters go to a small side list
+2. A query counts shared trigrams per string in one `np.bincount` over the
+   query's postings; this count prunes candidates exactly:
+   - `containing(q)`:   strings holding every trigram of q, then `q in s`
+   - `contained_in(q)`: strings whose trigrams all occur in q, then `s in q`
+3. `search(q, k)` returns the top-k string ids by trigram Dice similarity
+   (2·shared / (|q| + |s|)), substring matches first
+
+Works on plain strings; callers normalize queries and vocabulary the same
+way before indexing.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigram postings over a fixed list of strings (ids = list positions)."""
+
+    def __init__(self, strings):
+        self.strings = list(strings)
+        self.size = len(self.strings)
+
+        postings = defaultdict(list)
+        self.gram_counts = np.zeros(self.size, dtype=np.int32)
+        self.short = []
+        for i, s in enumerate(self.strings):
+            grams = trigrams(s)
+            if not grams:
+                self.short.append(i)
+                continue
+            self.gram_counts[i] = len(grams)
+            for g in grams:
+                postings[g].append(i)
+
+        self.postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    def _shared_counts(self, grams):
+        arrays = [self.postings[g] for g in grams if g in self.postings]
+        if not arrays:
+            return np.zeros(self.size, dtype=np.int64)
+        return np.bincount(np.concatenate(arrays), minlength=self.size)
+
+    # ---------- exact substring matching ----------
+
+    def containing(self, query, _counts=None):
+        """Ids of strings that contain `query`, in id order."""
+        grams = trigrams(query)
+        if not grams:
+            return [i for i, s in enumerate(self.strings) if query in s]
+        counts = self._shared_counts(grams) if _counts is None else _counts
+        candidates = np.flatnonzero(counts == len(grams))
+        return [int(i) for i in candidates if query in self.strings[i]]
+
+    def contained_in(self, query, _counts=None):
+        """Ids of strings that occur inside `query`, in id order."""
+        grams = trigrams(query)
+        ids = [i for i in self.short if self.strings[i] in query]
+        if grams:
+            counts = self._shared_counts(grams) if _counts is None else _counts
+            candidates = np.flatnonzero((counts == self.gram_counts) & (self.gram_counts > 0))
+            ids.extend(int(i) for i in candidates if self.strings[i] in query)
+        return sorted(ids)
+
+    def substring_matches(self, query):
+        """Ids of strings s with `query in s or s in query`, in id order."""
+        grams = trigrams(query)
+        counts = self._shared_counts(grams) if grams else None
+        return sorted(set(self.containing(query, counts)) | set(self.contained_in(query, counts)))
+
+    # ---------- ranked search ----------
+
+    def search(self, query, k=10, min_score=0.3):
+        """
+        Top-k [(id, score)] by trigram Dice similarity.
+
+        Substring matches (either direction) always qualify and rank first;
+        strings too short to have trigrams are left out of the ranking.
+        """
+        if not query:
+            return []
+
+        grams = trigrams(query)
+        counts = self._shared_counts(grams)
+        exact = set(self.containing(query, counts)) | set(self.contained_in(query, counts))
+        exact -= set(self.short)
+
+        denom = (len(grams) + self.gram_counts).astype(np.float64)
+        scores = np.divide(2.0 * counts, denom, out=np.zeros(self.size), where=denom > 0)
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+
+        ranked = exact | {int(i) for i in candidates}
+        order = sorted(ranked, key=lambda i: (i not in exact, -scores[i], i))
+        return [(i, float(scores[i])) for i in order[:k]]
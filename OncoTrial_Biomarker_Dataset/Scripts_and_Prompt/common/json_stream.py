@@ -0,0 +1,178 @@
+"""
+Streaming trial loader
+------------------------------------------
+Iterates over trial files entry by entry instead of `json.load`-ing the
+whole corpus, so memory stays bounded by the largest single trial.
+
+1. `iter_trials(path)` yields (nct_id, entry) pairs from
+   - a JSON object keyed by NCT ID (random_trials.json, the gold standard)
+   - a JSON list of records with an "nct_id" field (LLM extraction output)
+   - JSONL / NDJSON (.jsonl, .ndjson): one record with "nct_id" per line,
+     or one {nct_id: entry} object per line
+2. JSON files are read in chunks; each key / value is decoded with
+   `json.JSONDecoder.raw_decode` as soon as it is complete in the buffer,
+   and the buffer is dropped up to that point
+3. `write_trials()` writes (nct_id, entry) pairs incrementally, as JSONL or
+   as the same indent=2 JSON object layout `json.dump` produces
+
+Convert a dump to JSONL (from Scripts_and_Prompt/):
+
+    python -m common.json_stream random_trials.json random_trials.jsonl
+"""
+
+import argparse
+import json
+
+
+CHUNK_SIZE = 1 << 16
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+def is_jsonl(path):
+    return path.lower().endswith(JSONL_SUFFIXES)
+
+
+
+### ============================================================
+###  PART 1 — INCREMENTAL JSON READER
+### ============================================================
+
+class _ChunkReader:
+    """Buffered text reader that decodes one JSON value at a time."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, min_size=0):
+        if self.eof:
+            return False
+        chunk = self.f.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ("" at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch == "" or ch not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {ch or 'end of input'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # a number (or literal) touching the buffer end may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # grow geometrically so one large value is not re-decoded per chunk
+            if not self._fill(len(self.buf) - self.pos):
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return obj
+
+
+def _iter_json(f):
+    reader = _ChunkReader(f)
+    opening = reader.expect("{[")
+    closing = "}" if opening == "{" else "]"
+
+    if reader.peek() == closing:
+        reader.pos += 1
+        return
+
+    while True:
+        if opening == "{":
+            key = reader.value()
+            reader.expect(":")
+            yield key, reader.value()
+        else:
+            record = reader.value()
+            yield record.get("nct_id"), record
+        if reader.expect("," + closing) == closing:
+            return
+
+
+def _iter_jsonl(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if "nct_id" in record:
+            yield record["nct_id"], record
+        else:
+            yield from record.items()
+
+
+
+### ============================================================
+###  PART 2 — PUBLIC API
+### ============================================================
+
+def iter_trials(path):
+    """(nct_id, entry) pairs from a JSON object / list or a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from (_iter_jsonl(f) if is_jsonl(path) else _iter_json(f))
+
+
+def write_trials(pairs, path):
+    """Write (nct_id, entry) pairs as JSONL or as an indent=2 JSON object; returns the count."""
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if is_jsonl(path):
+            for nct_id, entry in pairs:
+                f.write(json.dumps({nct_id: entry}, ensure_ascii=False) + "\n")
+                n += 1
+            return n
+
+        for nct_id, entry in pairs:
+            body = json.dumps(entry, indent=2).replace("\n", "\n  ")
+            f.write(("{\n  " if n == 0 else ",\n  ") + f"{json.dumps(nct_id)}: {body}")
+            n += 1
+        f.write("\n}" if n else "{}")
+    return n
+
+
+
+### ============================================================
+###  PART 3 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a trial file between JSON and JSONL, streaming")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    n = write_trials(iter_trials(args.input), args.output)
+    print(f"Wrote {n} trials → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
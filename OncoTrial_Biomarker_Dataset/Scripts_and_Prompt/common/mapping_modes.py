@@ -0,0 +1,72 @@
+"""
+Mapping modes
+------------------------------------------
+The prediction filters compared by the evaluation scripts, loaded once and
+shared by evaluate_all_modes.py and the metric cube builder.
+
+1. Every mode is a filter (gold terms, extracted terms) -> predicted terms;
+   terms are lowercased and already restricted to the target scope
+2. LLM-only keeps every extracted term; Strict / Lenient keep terms with a
+   strict / lenient ontology mapping (mapped_strict.json, mapped_lenient.json)
+3. Oracle is perfect extraction limited by what the ontology vocabulary
+   (biomarker_aggregate.json) covers, matched as in oracle_gs_to_ontology.py
+
+A new mapping variant is one more method and one more entry in `filters()`.
+"""
+
+import json
+import re
+
+from common.fuzzy_index import TrigramIndex
+
+
+def oracle_normalize(text):
+    """Oracle normalization (same as oracle_gs_to_ontology.py)."""
+    text = text.lower()
+    text = re.sub(r"[^a-z0-9\s]", "", text)
+    return text.strip()
+
+
+class MappingModes:
+    """Strict / lenient mapping tables and the oracle vocabulary index."""
+
+    def __init__(self, strict_map, lenient_map, ontology_terms):
+        self.strict_map = strict_map
+        self.lenient_map = lenient_map
+        self.ontology_index = TrigramIndex(oracle_normalize(t) for t in ontology_terms)
+
+    @classmethod
+    def load(cls, strict_file, lenient_file, ontology_file):
+        with open(strict_file) as f:
+            strict_map = json.load(f)
+        with open(lenient_file) as f:
+            lenient_map = json.load(f)
+        with open(ontology_file) as f:
+            ontology_terms = list(json.load(f).keys())
+        return cls(strict_map, lenient_map, ontology_terms)
+
+    def llm_only(self, gold, extracted):
+        return extracted
+
+    def strict(self, gold, extracted):
+        # Keep only biomarkers that had a strict mapping (non-null)
+        return [b for b in extracted if self.strict_map.get(b) is not None]
+
+    def lenient(self, gold, extracted):
+        out = []
+        for term in extracted:
+            mapped_entry = self.lenient_map.get(term)
+            if mapped_entry and mapped_entry.get("mapped", True) is not None:
+                out.append(term)
+        return out
+
+    def oracle(self, gold, extracted):
+        return [b for b in gold if self.ontology_index.substring_matches(oracle_normalize(b))]
+
+    def filters(self):
+        return {
+            "LLM-only": self.llm_only,
+            "Strict": self.strict,
+            "Lenient": self.lenient,
+            "Oracle": self.oracle
+        }
@@ -0,0 +1,135 @@
+"""
+Metric cube
+------------------------------------------
+Pre-aggregated TP / FP / FN counts indexed by
+
+    model × n_shot × mode × family × side
+
+so any slice ("HER2-only exclusion under strict mapping") or rollup is a
+mask + sum over a few hundred rows instead of another evaluation run.
+
+1. One row per dimension combination; each dimension column holds integer
+   codes into its own label list, counts are int64 columns
+2. `side` is "inclusion", "exclusion" or "any"; "any" is the merged
+   inclusion + exclusion evaluation of the *_vs_gs.py scripts and is NOT
+   the sum of the two sides (a term can sit on the wrong side), so queries
+   default to side="any" unless a side is asked for
+3. `family` is the target family of the term (common/target_matcher.py),
+   "+"-joined when a term names several ("BRCA+HER2")
+4. Persisted as .npz, one array per column
+
+Build with Evaluation/build_metric_cube.py.
+"""
+
+import numpy as np
+
+
+DIMENSIONS = ("model", "n_shot", "mode", "family", "side")
+COUNTS = ("TP", "FP", "FN")
+SIDES = ("inclusion", "exclusion", "any")
+
+
+def _prf(TP, FP, FN):
+    precision = TP / (TP + FP) if TP + FP else 0
+    recall = TP / (TP + FN) if TP + FN else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+    return {"TP": TP, "FP": FP, "FN": FN, "Precision": precision, "Recall": recall, "F1": f1}
+
+
+class MetricCube:
+    """Columnar, pre-aggregated outcome counts."""
+
+    def __init__(self, labels, codes, counts):
+        self.labels = {d: list(labels[d]) for d in DIMENSIONS}
+        self.codes = codes
+        self.counts = counts
+        self._lookup = {d: {v: i for i, v in enumerate(self.labels[d])} for d in DIMENSIONS}
+
+    # ---------- build ----------
+
+    @classmethod
+    def from_records(cls, records):
+        """Aggregate (model, n_shot, mode, family, side, tp, fp, fn) records."""
+        cells = {}
+        for *dims, tp, fp, fn in records:
+            acc = cells.setdefault(tuple(dims), [0, 0, 0])
+            acc[0] += int(tp)
+            acc[1] += int(fp)
+            acc[2] += int(fn)
+
+        keys = sorted(cells, key=lambda k: tuple(map(str, k)))
+        labels = {d: sorted({k[j] for k in keys}, key=str) for j, d in enumerate(DIMENSIONS)}
+        lookup = {d: {v: i for i, v in enumerate(labels[d])} for d in DIMENSIONS}
+        codes = {
+            d: np.array([lookup[d][k[j]] for k in keys], dtype=np.int32)
+            for j, d in enumerate(DIMENSIONS)
+        }
+        values = np.array([cells[k] for k in keys], dtype=np.int64).reshape(-1, 3)
+        counts = {c: values[:, j].copy() for j, c in enumerate(COUNTS)}
+        return cls(labels, codes, counts)
+
+    # ---------- persistence ----------
+
+    def save(self, path):
+        columns = {d: self.codes[d] for d in DIMENSIONS}
+        columns.update({f"labels_{d}": np.array([str(v) for v in self.labels[d]]) for d in DIMENSIONS})
+        columns.update(self.counts)
+        # n_shot labels are numbers; keep their type across the round trip
+        columns["labels_n_shot"] = np.array(self.labels["n_shot"], dtype=np.int64)
+        np.savez(path, **columns)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        labels = {d: data[f"labels_{d}"].tolist() for d in DIMENSIONS}
+        codes = {d: data[d] for d in DIMENSIONS}
+        counts = {c: data[c] for c in COUNTS}
+        return cls(labels, codes, counts)
+
+    # ---------- queries ----------
+
+    def __len__(self):
+        return len(self.counts["TP"])
+
+    def _mask(self, filters):
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"unknown dimension(s): {', '.join(sorted(unknown))}")
+
+        filters = dict(filters)
+        filters.setdefault("side", "any")
+
+        mask = np.ones(len(self), dtype=bool)
+        for dim, value in filters.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            missing = [v for v in values if v not in self._lookup[dim]]
+            if missing:
+                raise KeyError(f"unknown {dim} label(s) {missing!r} "
+                               f"(have: {', '.join(map(str, self.labels[dim]))})")
+            wanted = [self._lookup[dim][v] for v in values]
+            mask &= np.isin(self.codes[dim], wanted)
+        return mask
+
+    def slice(self, **filters):
+        """P / R / F1 of the counts matching `filters` (dimension=label or [labels])."""
+        mask = self._mask(filters)
+        return _prf(*(int(self.counts[c][mask].sum()) for c in COUNTS))
+
+    def rollup(self, by, **filters):
+        """{group labels: P / R / F1} for the rows matching `filters`, grouped by `by`."""
+        by = [by] if isinstance(by, str) else list(by)
+        mask = self._mask(filters)
+
+        group_codes = np.stack([self.codes[d][mask] for d in by], axis=1)
+        groups, inverse = np.unique(group_codes, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        sums = {c: np.bincount(inverse, weights=self.counts[c][mask], minlength=len(groups))
+                for c in COUNTS}
+
+        out = {}
+        for g, codes in enumerate(groups):
+            key = tuple(self.labels[d][i] for d, i in zip(by, codes))
+            out[key if len(by) > 1 else key[0]] = _prf(*(int(sums[c][g]) for c in COUNTS))
+        return out
@@ -0,0 +1,155 @@
+"""
+Compiled biomarker normalizer
+------------------------------------------
+Single-pass replacement for the cleanup + alias loop of
+`normalize_biomarker()` in Strict_Lenient_mapping.py.
+
+1. Unicode dashes and parentheticals are handled by precompiled patterns
+   (the parenthesis pass is skipped when there is no "("); whitespace is
+   collapsed with split / join
+2. All gene aliases are substituted in one pass of a single precompiled
+   alternation (longest alias first) instead of a `str.replace` per alias
+3. Purely alphabetic aliases ("neu") only match outside words, so
+   "neuroblastoma" / "pneumonia" are left alone; aliases with digits or
+   dashes ("her2", "brca-1") still match inside tokens (gBRCA-1, anti-HER2),
+   as the old `str.replace` loop did
+4. The canonical map is applied to the result
+5. Results are memoized in a bounded LRU cache
+
+`python -m common.normalization` (from Scripts_and_Prompt/) runs a
+microbenchmark against the old loop.
+"""
+
+import re
+from functools import lru_cache
+
+
+DEFAULT_CACHE_SIZE = 1 << 16
+
+DASHES = re.compile("[–—‐‑]")
+PAREN = re.compile(r"\(.*?\)")
+
+
+def _alias_pattern(alias):
+    pattern = re.escape(alias)
+    if alias.isalpha():
+        pattern = r"(?<![a-z])" + pattern + r"(?![a-z])"
+    return pattern
+
+
+class BiomarkerNormalizer:
+    """Callable `term -> normalized term` for one alias / canonical vocabulary."""
+
+    def __init__(self, aliases, canonical=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.aliases = {k.lower(): v for k, v in aliases.items()}
+        self.canonical = dict(canonical or {})
+        self.alias_pattern = None
+        if self.aliases:
+            # the leading first-character class lets the scanner skip most positions
+            first = "".join(sorted({re.escape(a[0]) for a in self.aliases}))
+            alternatives = "|".join(
+                _alias_pattern(a) for a in sorted(self.aliases, key=len, reverse=True))
+            self.alias_pattern = re.compile(f"(?=[{first}])(?:{alternatives})")
+        self._normalize = lru_cache(maxsize=cache_size)(self._normalize_uncached)
+
+    def _alias(self, m):
+        return self.aliases[m.group(0)]
+
+    def _normalize_uncached(self, term):
+        t = DASHES.sub("-", term.lower())
+        if "(" in t:
+            t = PAREN.sub("", t)
+        t = " ".join(t.split())
+        if self.alias_pattern is not None:
+            t = self.alias_pattern.sub(self._alias, t)
+        return self.canonical.get(t, t)
+
+    def __call__(self, term):
+        return self._normalize(term)
+
+    def cache_info(self):
+        return self._normalize.cache_info()
+
+
+
+### ============================================================
+###  MICROBENCHMARK
+### ============================================================
+
+def _loop_normalize(term, aliases, canonical):
+    """The original multi-pass normalize_biomarker(), kept for comparison."""
+    t = term.lower().strip()
+    t = re.sub(r"\(.*?\)", "", t).strip()
+    t = t.replace("–", "-").replace("—", "-")
+    t = re.sub(r"\s+", " ", t)
+    for k, v in aliases.items():
+        t = t.replace(k, v)
+    if t in canonical:
+        t = canonical[t]
+    return t.strip()
+
+
+# must normalize exactly like the loop: parentheticals removed, the
+# surrounding words kept apart ("erbb2 positive", not "erbb2positive")
+EQUIVALENT_TERMS = [
+    "HER2 (IHC)positive",
+    "ERBB2 (HER2)amplified",
+    "BRCA1 mutation (germline)",
+    "  her2 ( IHC 3+ )  positive ",
+    "(germline) BRCA2 mutation",
+    "HER2 – amplification",
+]
+
+
+def synthetic_terms(n, distinct=20000, seed=0):
+    """`n` extracted-term-like strings drawn from `distinct` variants."""
+    import random
+
+    rng = random.Random(seed)
+    heads = ["HER2", "her-2", "ERBB2", "HER2/neu", "BRCA1", "BRCA-2", "gBRCA1", "BRCA 1/2", "Neu"]
+    tails = ["positive", "amplification", "mutation", "exon 20 insertion", "IHC 3+",
+             "overexpression", "negative", "status", "neuroendocrine", "expression"]
+    notes = ["", " (germline)", " (somatic)", " (ISH HER2/CEP17 ≥ 2.0)", " – confirmed", "  "]
+    variants = [
+        f"{rng.choice(heads)} {rng.choice(tails)}{rng.choice(notes)} {i % 97}"
+        for i in range(distinct)
+    ]
+    return [rng.choice(variants) for _ in range(n)]
+
+
+def benchmark(n=1_000_000):
+    import time
+    from common.vocabulary import GENE_ALIASES
+
+    terms = synthetic_terms(n)
+    normalizer = BiomarkerNormalizer(GENE_ALIASES)
+    cold = BiomarkerNormalizer(GENE_ALIASES, cache_size=0)
+
+    for term in EQUIVALENT_TERMS:
+        expected = _loop_normalize(term, GENE_ALIASES, {})
+        assert cold(term) == expected, (term, cold(term), expected)
+
+    start = time.perf_counter()
+    old = [_loop_normalize(t, GENE_ALIASES, {}) for t in terms]
+    t_old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncached = [cold(t) for t in terms]
+    t_uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = [normalizer(t) for t in terms]
+    t_new = time.perf_counter() - start
+
+    assert new == uncached
+    differ = sum(a != b for a, b in zip(old, new))
+    print(f"{n} terms, {len(set(terms))} distinct")
+    print(f"  loop normalizer:       {t_old:.2f}s")
+    print(f"  compiled, no cache:    {t_uncached:.2f}s ({t_old / t_uncached:.1f}x)")
+    print(f"  compiled + memoized:   {t_new:.2f}s ({t_old / t_new:.1f}x), {normalizer.cache_info()}")
+    print(f"  outputs differing from the loop: {differ} "
+          f"(e.g. {next((t for t, a, b in zip(terms, old, new) if a != b), None)!r})")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,251 @@
+"""
+Ontology hierarchy index
+------------------------------------------
+Concept hierarchy (is-a) of one ontology with the transitive closure
+precomputed, so lenient mapping / evaluation can credit parent-level
+matches (a specific ERBB2 mutation falling back to the gene concept, see
+Lenient_validation.txt) without API calls.
+
+1. Parent links come from the NCIt flat export (Thesaurus.txt, column 3)
+   or from UMLS MRREL.RRF (REL = PAR rows, optionally limited to some SABs)
+2. Concept codes are interned to integers; parents and ancestor sets are
+   stored as CSR integer arrays (indptr + sorted indices), saved as .npz
+3. `is_descendant(x, y)` is one row slice + binary search in x's (short)
+   ancestor row; `nearest_mapped_ancestor()` walks parents breadth-first
+   and returns the closest ancestor from a given set of mapped codes
+
+Build:
+
+    python -m common.ontology_hierarchy --ncit Thesaurus.txt --output ncit_hierarchy.npz
+    python -m common.ontology_hierarchy --mrrel MRREL.RRF --sab NCI --output umls_hierarchy.npz
+"""
+
+import argparse
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+### ============================================================
+###  PART 1 — PARENT LINK READERS
+### ============================================================
+
+def read_ncit_parents(path):
+    """Yield (child, parent) codes from the NCIt flat file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 3:
+                continue
+            yield cols[0], None
+            for parent in cols[2].split("|"):
+                if parent:
+                    yield cols[0], parent
+
+
+def read_mrrel_parents(path, sources=None):
+    """
+    Yield (child, parent) CUIs from MRREL.RRF.
+
+    Columns: CUI1|AUI1|STYPE1|REL|CUI2|AUI2|STYPE2|RELA|RUI|SRUI|SAB|SL|RG|DIR|SUPPRESS|CVF
+    REL = PAR means CUI2 is a parent of CUI1.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("|")
+            if len(cols) < 15 or cols[3] != "PAR":
+                continue
+            if sources and cols[10] not in sources:
+                continue
+            if cols[14] not in ("N", "") or cols[0] == cols[4]:
+                continue
+            yield cols[0], cols[4]
+
+
+
+### ============================================================
+###  PART 2 — HIERARCHY
+### ============================================================
+
+def _csr(rows):
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(r) for r in rows])
+    indices = np.fromiter((i for r in rows for i in sorted(r)), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+
+class OntologyHierarchy:
+    """Interned concept codes with CSR parent and ancestor arrays."""
+
+    def __init__(self, codes, parent_indptr, parent_indices, anc_indptr, anc_indices):
+        self.codes = list(codes)
+        self.index = {c: i for i, c in enumerate(self.codes)}
+        self.parent_indptr = parent_indptr
+        self.parent_indices = parent_indices
+        self.anc_indptr = anc_indptr
+        self.anc_indices = anc_indices
+
+    # ---------- build ----------
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Build from (child, parent) pairs; parent None only registers the child."""
+        index, codes = {}, []
+        parents = defaultdict(set)
+
+        def intern(code):
+            i = index.get(code)
+            if i is None:
+                i = index[code] = len(codes)
+                codes.append(code)
+            return i
+
+        for child, parent in edges:
+            c = intern(child)
+            if parent is not None:
+                parents[c].add(intern(parent))
+
+        n = len(codes)
+        parent_rows = [parents.get(i, ()) for i in range(n)]
+        ancestors = cls._closure(parent_rows)
+        return cls(codes, *_csr(parent_rows), *_csr(ancestors))
+
+    @staticmethod
+    def _closure(parent_rows):
+        """Ancestor set per node: parents first (topological order), cycles by BFS."""
+        n = len(parent_rows)
+        children = defaultdict(list)
+        pending = [len(ps) for ps in parent_rows]
+        for c, ps in enumerate(parent_rows):
+            for p in ps:
+                children[p].append(c)
+
+        ancestors = [None] * n
+        queue = deque(i for i in range(n) if pending[i] == 0)
+        while queue:
+            node = queue.popleft()
+            acc = set(parent_rows[node])
+            for p in parent_rows[node]:
+                acc |= ancestors[p]
+            ancestors[node] = frozenset(acc)
+            for c in children[node]:
+                pending[c] -= 1
+                if pending[c] == 0:
+                    queue.append(c)
+
+        # nodes on or below a cycle: plain upward BFS
+        for node in range(n):
+            if ancestors[node] is None:
+                seen, todo = set(), list(parent_rows[node])
+                while todo:
+                    p = todo.pop()
+                    if p not in seen:
+                        seen.add(p)
+                        todo.extend(parent_rows[p])
+                seen.discard(node)
+                ancestors[node] = frozenset(seen)
+        return ancestors
+
+    # ---------- persistence ----------
+
+    def save(self, path):
+        np.savez(path, codes=np.array(self.codes),
+                 parent_indptr=self.parent_indptr, parent_indices=self.parent_indices,
+                 anc_indptr=self.anc_indptr, anc_indices=self.anc_indices)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["codes"].tolist(), data["parent_indptr"], data["parent_indices"],
+                   data["anc_indptr"], data["anc_indices"])
+
+    # ---------- queries ----------
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def _row(self, indptr, indices, i):
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def parents(self, code):
+        i = self.index.get(code)
+        if i is None:
+            return []
+        return [self.codes[p] for p in self._row(self.parent_indptr, self.parent_indices, i)]
+
+    def ancestors(self, code):
+        i = self.index.get(code)
+        if i is None:
+            return []
+        return [self.codes[a] for a in self._row(self.anc_indptr, self.anc_indices, i)]
+
+    def is_descendant(self, code, ancestor):
+        """True if `ancestor` is a strict ancestor of `code`."""
+        i, j = self.index.get(code), self.index.get(ancestor)
+        if i is None or j is None:
+            return False
+        row = self._row(self.anc_indptr, self.anc_indices, i)
+        k = np.searchsorted(row, j)
+        return bool(k < len(row) and row[k] == j)
+
+    def is_related(self, a, b):
+        """Same concept, or one is an ancestor of the other."""
+        return a == b or self.is_descendant(a, b) or self.is_descendant(b, a)
+
+    def nearest_mapped_ancestor(self, code, mapped):
+        """(ancestor, distance) of the closest ancestor of `code` in `mapped`, or None."""
+        i = self.index.get(code)
+        if i is None:
+            return None
+
+        seen, frontier, distance = {i}, [i], 0
+        while frontier:
+            distance += 1
+            nxt = []
+            for node in frontier:
+                for p in self._row(self.parent_indptr, self.parent_indices, node):
+                    p = int(p)
+                    if p in seen:
+                        continue
+                    seen.add(p)
+                    if self.codes[p] in mapped:
+                        return self.codes[p], distance
+                    nxt.append(p)
+            frontier = sorted(nxt)
+        return None
+
+
+
+### ============================================================
+###  PART 3 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an ontology hierarchy index (.npz)")
+    parser.add_argument("--ncit", help="NCIt flat file (Thesaurus.txt)")
+    parser.add_argument("--mrrel", help="UMLS MRREL.RRF")
+    parser.add_argument("--sab", nargs="*", help="only keep PAR links from these UMLS sources")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    if bool(args.ncit) == bool(args.mrrel):
+        parser.error("give exactly one of --ncit / --mrrel")
+
+    start = time.time()
+    if args.ncit:
+        edges = read_ncit_parents(args.ncit)
+    else:
+        edges = read_mrrel_parents(args.mrrel, set(args.sab) if args.sab else None)
+
+    hierarchy = OntologyHierarchy.from_edges(edges)
+    hierarchy.save(args.output)
+    print(f"Built {args.output} in {time.time() - start:.1f}s: {len(hierarchy)} concepts, "
+          f"{len(hierarchy.parent_indices)} parent links, {len(hierarchy.anc_indices)} ancestor pairs")
+
+
+if __name__ == "__main__":
+    main()
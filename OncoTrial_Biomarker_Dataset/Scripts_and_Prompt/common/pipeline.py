@@ -0,0 +1,394 @@
+"""
+Incremental pipeline runner
+------------------------------------------
+Runs the standalone scripts (extraction → aggregation → mapping →
+evaluation → plots) as one DAG and skips every stage whose inputs, code
+and config are unchanged since its last successful run.
+
+1. A stage is a script plus the files it reads (`inputs`), the files it
+   writes (`outputs`), its command-line args and the environment variables
+   it takes config from; the DAG edges come from outputs → inputs
+2. A stage's fingerprint is a SHA-256 over the content hashes of its
+   inputs, its script and every local module it imports (found by walking
+   the imports with `ast`: sibling modules and common/*), its args and the
+   values of its config env vars
+3. A stage runs when its fingerprint differs from the recorded one, an
+   output is missing or was changed since, or it is forced; otherwise it
+   is skipped. Stages whose dependencies are done run in parallel
+   (one subprocess each, output captured in a per-stage log)
+4. The state (fingerprint + output hashes per stage) is a JSON file,
+   rewritten after every finished stage; a per-stage timing table is
+   printed at the end
+
+Run:
+
+    python -m common.pipeline                       # from Scripts_and_Prompt/
+    python -m common.pipeline --dry-run
+    python -m common.pipeline --force mapping --workers 4
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_ROOT = "/mnt/data/projects/oncotrialLLM/llm/Personal_data_sets"
+
+STATE_FILE = os.path.join(DATA_ROOT, "Results", ".pipeline_state.json")
+LOG_DIR = os.path.join(DATA_ROOT, "Results", ".pipeline_logs")
+
+HASH_CHUNK = 1 << 20
+
+
+
+### ============================================================
+###  PART 1 — HASHING
+### ============================================================
+
+def file_digest(path, _memo={}):
+    """SHA-256 of a file's content (None if missing), memoized on (size, mtime)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        _memo[key] = h.hexdigest()
+    return _memo[key]
+
+
+def local_modules(script, roots):
+    """`script` plus every module under `roots` it imports, transitively."""
+    seen, todo = set(), [os.path.abspath(script)]
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        try:
+            tree = ast.parse(open(path, encoding="utf-8").read(), path)
+        except SyntaxError:
+            continue
+
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.extend(a.name for a in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.append(node.module)
+                names.extend(f"{node.module}.{a.name}" for a in node.names)
+
+        for name in names:
+            rel = name.replace(".", os.sep) + ".py"
+            for root in [os.path.dirname(path), *roots]:
+                candidate = os.path.abspath(os.path.join(root, rel))
+                if os.path.exists(candidate):
+                    todo.append(candidate)
+                    break
+    return sorted(seen)
+
+
+
+### ============================================================
+###  PART 2 — STAGES + DAG
+### ============================================================
+
+class Stage:
+    """One script run with declared input / output files and config."""
+
+    def __init__(self, name, script, inputs=(), outputs=(), args=(), env=()):
+        self.name = name
+        self.script = os.path.abspath(script)
+        self.inputs = [os.path.abspath(p) for p in inputs]
+        self.outputs = [os.path.abspath(p) for p in outputs]
+        self.args = list(args)
+        self.env = list(env)
+
+    def fingerprint(self, roots):
+        h = hashlib.sha256()
+        parts = {
+            "code": {os.path.relpath(p, roots[0]): file_digest(p)
+                     for p in local_modules(self.script, roots)},
+            "inputs": {p: file_digest(p) for p in self.inputs},
+            "args": self.args,
+            "env": {k: os.environ.get(k) for k in self.env}
+        }
+        h.update(json.dumps(parts, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def command(self):
+        return [sys.executable, self.script, *self.args]
+
+
+class Pipeline:
+    """Stages ordered by their file dependencies."""
+
+    def __init__(self, stages, state_file=STATE_FILE, log_dir=LOG_DIR, roots=(SCRIPTS_DIR,)):
+        self.stages = {s.name: s for s in stages}
+        self.state_file = state_file
+        self.log_dir = log_dir
+        self.roots = [os.path.abspath(r) for r in roots]
+
+        producer = {}
+        for s in stages:
+            for out in s.outputs:
+                if out in producer:
+                    raise ValueError(f"{out} is written by both {producer[out]} and {s.name}")
+                producer[out] = s.name
+        self.deps = {
+            s.name: sorted({producer[p] for p in s.inputs if p in producer} - {s.name})
+            for s in stages
+        }
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, done, visiting = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"dependency cycle through stage {name}")
+            visiting.add(name)
+            for dep in self.deps[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # ---------- state ----------
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_file)
+
+    def is_fresh(self, stage, fingerprint, state):
+        record = state.get(stage.name)
+        if not record or record.get("fingerprint") != fingerprint:
+            return False
+        recorded = record.get("outputs", {})
+        return all(file_digest(p) is not None and file_digest(p) == recorded.get(p)
+                   for p in stage.outputs)
+
+    # ---------- execution ----------
+
+    def _execute(self, stage):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, f"{stage.name}.log")
+        start = time.time()
+        with open(log_path, "w") as log:
+            proc = subprocess.run(stage.command(), cwd=os.path.dirname(stage.script),
+                                  stdout=log, stderr=subprocess.STDOUT)
+        return proc.returncode, time.time() - start, log_path
+
+    def run(self, workers=4, force=(), dry_run=False):
+        """Run stale stages; returns {stage: {"status", "seconds"}}."""
+        force = set(self.stages) if force is None else set(force)
+        unknown = force - set(self.stages)
+        if unknown:
+            raise ValueError(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+        state = self.load_state()
+        report = {}
+        pending = list(self.order)
+        running = {}
+
+        def settled(name):
+            return name in report and name not in running
+
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            while pending or running:
+                for name in list(pending):
+                    if not all(settled(d) for d in self.deps[name]):
+                        continue
+                    pending.remove(name)
+                    stage = self.stages[name]
+
+                    if any(report[d]["status"] in ("failed", "blocked") for d in self.deps[name]):
+                        report[name] = {"status": "blocked", "seconds": 0.0}
+                        continue
+
+                    upstream_stale = any(report[d]["status"] == "would run" for d in self.deps[name])
+                    start = time.time()
+                    fingerprint = stage.fingerprint(self.roots)
+                    if name not in force and not upstream_stale and self.is_fresh(stage, fingerprint, state):
+                        report[name] = {"status": "skipped", "seconds": time.time() - start}
+                        continue
+                    if dry_run:
+                        report[name] = {"status": "would run", "seconds": 0.0}
+                        continue
+
+                    print(f"[pipeline] running {name}: {shlex.join(stage.command())}")
+                    running[name] = pool.submit(self._execute, stage)
+                    report[name] = {"status": "running", "fingerprint": fingerprint}
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, future in list(running.items()):
+                    if future not in finished:
+                        continue
+                    del running[name]
+                    fingerprint = report[name]["fingerprint"]
+                    try:
+                        code, seconds, log_path = future.result()
+                    except OSError as e:
+                        code, seconds, log_path = -1, 0.0, str(e)
+
+                    if code == 0:
+                        state[name] = {
+                            "fingerprint": fingerprint,
+                            "outputs": {p: file_digest(p) for p in self.stages[name].outputs},
+                            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                            "seconds": round(seconds, 3)
+                        }
+                        self.save_state(state)
+                        report[name] = {"status": "ran", "seconds": seconds}
+                    else:
+                        report[name] = {"status": "failed", "seconds": seconds}
+                        print(f"[pipeline] {name} failed (exit {code}), log: {log_path}")
+
+        return report
+
+
+
+### ============================================================
+###  PART 3 — THE ONCOTRIAL PIPELINE
+### ============================================================
+
+def _data(*parts):
+    return os.path.join(DATA_ROOT, *parts)
+
+
+def _script(*parts):
+    return os.path.join(SCRIPTS_DIR, *parts)
+
+
+RAW_TRIALS = _data("Datasets", "Raw_data", "random_trials.json")
+GOLD = _data("Datasets", "Golden_standard", "random_trials_annotated.json")
+EXTRACTION = _data("Results", "LLM_extraction", "gpt-4.0-turbo_1shot.json")
+AGGREGATE = _data("Results", "LLM_extraction", "biomarker_aggregate.json")
+MAPPED_STRICT = _data("Results", "Ontology_Validation", "mapped_strict.json")
+MAPPED_LENIENT = _data("Results", "Ontology_Validation", "mapped_lenient.json")
+MAPPED_GOLD = _data("Results", "Ontology_Validation", "mapped_gold_lenient.json")
+# optional hierarchy indexes read by Strict_Lenient_mapping.py / evaluate_lenient_vs_gs.py
+HIERARCHIES = [_data("Results", "Ontology_Validation", f) for f in ("ncit_hierarchy.npz", "umls_hierarchy.npz")]
+# optional columnar store read by llm_only_vs_gs.py
+TRIAL_STORE_INDEX = _data("Results", "trial_store", "index.npz")
+EVAL_DIR = _data("Results", "Evaluation")
+
+# extra 1shot_extraction.py args, e.g. "--mode async --gate"
+EXTRACTION_ARGS = shlex.split(os.getenv("PIPELINE_EXTRACTION_ARGS", ""))
+
+
+def _option_files(args, *flags):
+    """Values of `--flag value` / `--flag=value` options in `args` (files the stage reads)."""
+    files = []
+    for i, arg in enumerate(args):
+        for flag in flags:
+            if arg == flag and i + 1 < len(args):
+                files.append(args[i + 1])
+            elif arg.startswith(flag + "="):
+                files.append(arg[len(flag) + 1:])
+    return files
+
+# env vars that change mapping results (the API key does not)
+MAPPING_ENV = ["UMLS_VERSION", "ONTOLOGY_INDEX", "ONTOLOGY_FUZZY_K", "ONTOLOGY_FUZZY_SOURCES"]
+
+
+def oncotrial_stages():
+    return [
+        Stage("extraction", _script("LLM_extraction", "1shot_extraction.py"),
+              inputs=[RAW_TRIALS,
+                      _script("LLM_extraction", "biomarker_extraction_1shot.txt"),
+                      _script("LLM_extraction", "biomarker_extraction_1shot_packed.txt"),
+                      *_option_files(EXTRACTION_ARGS, "--input", "--gate-index")],
+              outputs=[EXTRACTION],
+              args=EXTRACTION_ARGS),
+        Stage("aggregate", _script("Ontology_Validation", "Aggregate.py"),
+              inputs=[EXTRACTION], outputs=[AGGREGATE]),
+        Stage("mapping", _script("Ontology_Validation", "Strict_Lenient_mapping.py"),
+              inputs=[AGGREGATE, GOLD, *HIERARCHIES], outputs=[MAPPED_STRICT, MAPPED_LENIENT, MAPPED_GOLD],
+              env=MAPPING_ENV),
+        Stage("eval_llm_only", _script("Evaluation", "llm_only_vs_gs.py"),
+              inputs=[GOLD, EXTRACTION, TRIAL_STORE_INDEX],
+              outputs=[os.path.join(EVAL_DIR, "llm_extraction_eval.json")]),
+        Stage("eval_strict", _script("Evaluation", "strict_mapping_vs_gs.py"),
+              inputs=[GOLD, EXTRACTION, MAPPED_STRICT],
+              outputs=[os.path.join(EVAL_DIR, "strict_mapping_vs_gs.json")]),
+        Stage("eval_lenient", _script("Evaluation", "evaluate_lenient_vs_gs.py"),
+              inputs=[GOLD, EXTRACTION, MAPPED_LENIENT, MAPPED_GOLD, *HIERARCHIES],
+              outputs=[os.path.join(EVAL_DIR, "lenient_vs_gs.json")]),
+        Stage("eval_all_modes", _script("Evaluation", "evaluate_all_modes.py"),
+              inputs=[GOLD, EXTRACTION, MAPPED_STRICT, MAPPED_LENIENT, AGGREGATE],
+              outputs=[os.path.join(EVAL_DIR, "all_modes_vs_gs.json")]),
+        Stage("metric_cube", _script("Evaluation", "build_metric_cube.py"),
+              inputs=[GOLD, EXTRACTION, MAPPED_STRICT, MAPPED_LENIENT, AGGREGATE],
+              outputs=[os.path.join(EVAL_DIR, "metric_cube.npz")]),
+        # histogram.py has its numbers hard-coded; it is ordered after the
+        # evaluators so the plots are redrawn whenever they change
+        Stage("plots", _script("Evaluation", "histogram.py"),
+              inputs=[os.path.join(EVAL_DIR, f) for f in
+                      ("llm_extraction_eval.json", "strict_mapping_vs_gs.json", "lenient_vs_gs.json")],
+              outputs=[os.path.join(EVAL_DIR, f"{m}_comparison.png") for m in ("precision", "recall", "f1score")])
+    ]
+
+
+
+### ============================================================
+###  PART 4 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stale stages of the OncoTrial pipeline")
+    parser.add_argument("--workers", type=int, default=4, help="stages run in parallel")
+    parser.add_argument("--force", nargs="*", default=(),
+                        help="rerun these stages even if fresh (no names: all stages)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("--state", default=STATE_FILE)
+    args = parser.parse_args()
+
+    pipeline = Pipeline(oncotrial_stages(), state_file=args.state)
+    force = None if args.force == [] else args.force
+
+    start = time.time()
+    report = pipeline.run(workers=args.workers, force=force, dry_run=args.dry_run)
+
+    print(f"\n{'stage':<16}{'status':<12}{'seconds':>9}")
+    for name in pipeline.order:
+        r = report[name]
+        print(f"{name:<16}{r['status']:<12}{r['seconds']:>9.2f}")
+    print(f"total {time.time() - start:.2f}s")
+
+    if any(r["status"] in ("failed", "blocked") for r in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
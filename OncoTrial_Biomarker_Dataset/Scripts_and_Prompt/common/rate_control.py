@@ -0,0 +1,300 @@
+"""
+Adaptive Rate Control for outbound API calls
+------------------------------------------
+One layer used by the OpenAI extraction calls and the UMLS / NCIt lookups.
+
+1. Token bucket: caps the request rate (requests / second, with a burst)
+2. Retry with exponential backoff + full jitter on 429, 5xx, timeouts and
+   connection errors; a Retry-After header is honoured when present
+3. AIMD concurrency: the in-flight limit grows by ~1 per round of
+   successes and is halved on a 429 / 5xx / timeout
+4. Every request, retry, throttle and give-up is counted in `stats`
+
+Works from threads (`call`) and from asyncio (`call_async`).
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5   # seconds
+DEFAULT_MAX_DELAY = 30.0   # seconds
+
+
+
+### ============================================================
+###  PART 1 — OUTCOME CLASSIFICATION
+### ============================================================
+
+def _status_of(obj):
+    status = getattr(obj, "status_code", None)
+    if status is None:
+        status = getattr(getattr(obj, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(obj):
+    headers = getattr(obj, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(obj, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_transport_error(exc):
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def classify(result=None, exc=None):
+    """
+    "ok"       success (or a non-retryable HTTP answer, returned as-is)
+    "throttle" HTTP 429
+    "server"   other retryable HTTP status (5xx, 408, ...)
+    "timeout"  timeout / connection error
+    "fatal"    any other exception, re-raised immediately
+    """
+    status = _status_of(exc if exc is not None else result)
+    if status == 429:
+        return "throttle"
+    if status in RETRYABLE_STATUS or (status is not None and status >= 500):
+        return "server"
+    if exc is not None:
+        return "timeout" if _is_transport_error(exc) else "fatal"
+    return "ok"
+
+
+def backoff_delay(attempt, base=DEFAULT_BASE_DELAY, cap=DEFAULT_MAX_DELAY):
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+
+### ============================================================
+###  PART 2 — TOKEN BUCKET + AIMD
+### ============================================================
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        """Take one token; return 0, or the seconds to wait before retrying."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        waited = False
+        while True:
+            wait = self._take()
+            if not wait:
+                return waited
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        waited = False
+        while True:
+            wait = self._take()
+            if not wait:
+                return waited
+            waited = True
+            await asyncio.sleep(wait)
+
+
+class AIMD:
+    """Additive-increase / multiplicative-decrease in-flight limit."""
+
+    def __init__(self, initial, minimum=1, maximum=None, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum if maximum is not None else initial
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+
+    def on_success(self):
+        # about +1 per round of `limit` successful requests
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_congestion(self):
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return False
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        return True
+
+    def allowed(self):
+        return max(self.minimum, int(self.limit))
+
+
+
+### ============================================================
+###  PART 3 — RATE CONTROLLER
+### ============================================================
+
+class RateController:
+    """Token bucket + retry/backoff + AIMD concurrency, with event counters."""
+
+    def __init__(self, rate=None, burst=None, concurrency=8, max_concurrency=None,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, name="api"):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.aimd = AIMD(concurrency, maximum=max_concurrency or concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.async_cond = None
+
+        self.stats = {
+            "requests": 0, "retries": 0, "throttled": 0, "server_errors": 0,
+            "timeouts": 0, "rate_waits": 0, "concurrency_decreases": 0, "gave_up": 0
+        }
+
+    def _record(self, outcome):
+        if outcome == "ok":
+            self.aimd.on_success()
+            return
+        self.stats[{"throttle": "throttled", "server": "server_errors",
+                    "timeout": "timeouts"}[outcome]] += 1
+        if self.aimd.on_congestion():
+            self.stats["concurrency_decreases"] += 1
+
+    def _count(self, key):
+        # call() runs on worker threads; counters change under the lock only
+        with self.cond:
+            self.stats[key] += 1
+
+    def _delay(self, attempt, obj):
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        retry_after = _retry_after(obj)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    # ---------- threads ----------
+
+    def call(self, fn, *args, **kwargs):
+        """Call `fn` with rate limiting and retries; return its result."""
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None and self.bucket.acquire():
+                self._count("rate_waits")
+
+            with self.cond:
+                self.cond.wait_for(lambda: self.in_flight < self.aimd.allowed())
+                self.in_flight += 1
+                self.stats["requests"] += 1
+
+            result = exc = None
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                exc = e
+            except BaseException:
+                with self.cond:
+                    self.in_flight -= 1
+                    self.cond.notify_all()
+                raise
+
+            outcome = classify(result, exc)
+            with self.cond:
+                self.in_flight -= 1
+                if outcome != "fatal":
+                    self._record(outcome)
+                self.cond.notify_all()
+
+            if outcome == "fatal":
+                raise exc
+            if outcome == "ok":
+                return result
+
+            if attempt == self.max_retries:
+                self._count("gave_up")
+                if exc is not None:
+                    raise exc
+                return result
+
+            self._count("retries")
+            time.sleep(self._delay(attempt, exc if exc is not None else result))
+
+    # ---------- asyncio ----------
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)` with rate limiting and retries."""
+        if self.async_cond is None:
+            self.async_cond = asyncio.Condition()
+
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None and await self.bucket.acquire_async():
+                self._count("rate_waits")
+
+            async with self.async_cond:
+                await self.async_cond.wait_for(lambda: self.in_flight < self.aimd.allowed())
+                self.in_flight += 1
+            self._count("requests")
+
+            result = exc = None
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                exc = e
+            except BaseException:
+                async with self.async_cond:
+                    self.in_flight -= 1
+                    self.async_cond.notify_all()
+                raise
+
+            outcome = classify(result, exc)
+            async with self.async_cond:
+                self.in_flight -= 1
+                if outcome != "fatal":
+                    self._record(outcome)
+                self.async_cond.notify_all()
+
+            if outcome == "fatal":
+                raise exc
+            if outcome == "ok":
+                return result
+
+            if attempt == self.max_retries:
+                self._count("gave_up")
+                if exc is not None:
+                    raise exc
+                return result
+
+            self._count("retries")
+            await asyncio.sleep(self._delay(attempt, exc if exc is not None else result))
+
+    def summary(self):
+        s = self.stats
+        return (f"Rate control [{self.name}]: {s['requests']} requests, {s['retries']} retries, "
+                f"{s['throttled']} throttled (429), {s['server_errors']} server errors, "
+                f"{s['timeouts']} timeouts, {s['rate_waits']} rate waits, "
+                f"{s['concurrency_decreases']} concurrency cuts (limit now {self.aimd.allowed()}), "
+                f"{s['gave_up']} gave up")
@@ -0,0 +1,164 @@
+"""
+Bootstrap intervals and paired permutation tests
+------------------------------------------
+Uncertainty for the micro P / R / F1 computed by common/eval_core.py, with
+trials as the resampling unit.
+
+1. `bootstrap_ci()` resamples trials with replacement; each shard of
+   resamples is one (resamples × trials) index matrix, so the resampled
+   TP / FP / FN sums are one NumPy gather + row sum per count
+2. `paired_permutation()` compares two systems on the same trials by
+   swapping their per-trial counts at random; a shard of permutations is
+   one (permutations × trials) 0/1 matrix product with the count differences
+3. Shards have a fixed size and their own child seed (SeedSequence.spawn),
+   so results depend only on `seed`, not on the number of workers; shards
+   run in a process pool (fork) when `workers` > 1
+
+`python -m common.significance` (from Scripts_and_Prompt/) times 10,000
+resamples over a synthetic set of trials.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+N_RESAMPLES = 10000
+SHARD_SIZE = 500
+METRICS = ("Precision", "Recall", "F1")
+
+
+
+### ============================================================
+###  PART 1 — VECTORIZED METRICS
+### ============================================================
+
+def micro_prf(TP, FP, FN):
+    """Micro P / R / F1 for arrays of summed counts (0 where undefined)."""
+    TP, FP, FN = (np.asarray(x, dtype=np.float64) for x in (TP, FP, FN))
+    precision = np.divide(TP, TP + FP, out=np.zeros_like(TP), where=TP + FP > 0)
+    recall = np.divide(TP, TP + FN, out=np.zeros_like(TP), where=TP + FN > 0)
+    pr = precision + recall
+    f1 = np.divide(2 * precision * recall, pr, out=np.zeros_like(TP), where=pr > 0)
+    return precision, recall, f1
+
+
+def _counts(tp, fp, fn):
+    return np.stack([np.asarray(x, dtype=np.int64) for x in (tp, fp, fn)])
+
+
+
+### ============================================================
+###  PART 2 — SHARD WORKERS
+### ============================================================
+
+def _bootstrap_shard(counts, size, seed):
+    """(3, size) resampled TP / FP / FN sums."""
+    rng = np.random.default_rng(seed)
+    n = counts.shape[1]
+    idx = rng.integers(0, n, size=(size, n))
+    return np.stack([row[idx].sum(axis=1) for row in counts])
+
+
+def _permutation_shard(a, b, size, seed):
+    """(size,) micro F1 differences A − B after random per-trial swaps."""
+    rng = np.random.default_rng(seed)
+    n = a.shape[1]
+    swap = rng.integers(0, 2, size=(size, n), dtype=np.int8).astype(np.float64)
+    delta = (b - a).T.astype(np.float64)              # (n, 3)
+    moved = swap @ delta                              # (size, 3)
+    sums_a = a.sum(axis=1) + moved
+    sums_b = b.sum(axis=1) - moved
+    return micro_prf(*sums_a.T)[2] - micro_prf(*sums_b.T)[2]
+
+
+def _run_shards(fn, args, n, seed, workers):
+    sizes = [SHARD_SIZE] * (n // SHARD_SIZE) + ([n % SHARD_SIZE] if n % SHARD_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(*args, size, s) for size, s in zip(sizes, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        # the evaluation scripts run at module level, so never re-import them
+        # in spawned children
+        return [fn(*job) for job in jobs]
+
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        return list(pool.map(fn, *zip(*jobs)))
+
+
+
+### ============================================================
+###  PART 3 — PUBLIC API
+### ============================================================
+
+def bootstrap_ci(tp, fp, fn, n_resamples=N_RESAMPLES, alpha=0.05, seed=0, workers=None):
+    """
+    Percentile bootstrap intervals over trials:
+    {"Precision": [lo, hi], "Recall": [lo, hi], "F1": [lo, hi], ...}.
+    """
+    counts = _counts(tp, fp, fn)
+    if counts.shape[1] == 0:
+        return {}
+
+    sums = np.concatenate(_run_shards(_bootstrap_shard, (counts,), n_resamples, seed, workers), axis=1)
+    values = micro_prf(*sums)
+    out = {
+        name: [float(q) for q in np.quantile(v, [alpha / 2, 1 - alpha / 2])]
+        for name, v in zip(METRICS, values)
+    }
+    out.update({"confidence": 1 - alpha, "resamples": n_resamples, "seed": seed})
+    return out
+
+
+def paired_permutation(a, b, n_permutations=N_RESAMPLES, seed=0, workers=None):
+    """
+    Two-sided paired permutation test of micro F1 for systems `a` and `b`,
+    each a (tp, fp, fn) tuple of per-trial arrays over the same trials.
+    """
+    a, b = _counts(*a), _counts(*b)
+    if a.shape != b.shape:
+        raise ValueError(f"systems are scored on different trials: {a.shape[1]} vs {b.shape[1]}")
+
+    observed = float(micro_prf(*a.sum(axis=1))[2] - micro_prf(*b.sum(axis=1))[2])
+    diffs = np.concatenate(_run_shards(_permutation_shard, (a, b), n_permutations, seed, workers))
+    extreme = int(np.sum(np.abs(diffs) >= abs(observed) - 1e-12))
+    return {
+        "F1_difference": observed,
+        "p_value": (extreme + 1) / (n_permutations + 1),
+        "permutations": n_permutations,
+        "seed": seed
+    }
+
+
+
+### ============================================================
+###  BENCHMARK
+### ============================================================
+
+def benchmark(n_trials=5000, n_resamples=N_RESAMPLES):
+    import time
+
+    rng = np.random.default_rng(0)
+    gold = rng.integers(0, 4, n_trials)
+    tp = rng.binomial(gold, 0.6)
+    fp = rng.integers(0, 2, n_trials)
+    tp_b = rng.binomial(gold, 0.5)
+
+    start = time.perf_counter()
+    ci = bootstrap_ci(tp, fp, gold - tp, n_resamples)
+    t_ci = time.perf_counter() - start
+
+    start = time.perf_counter()
+    test = paired_permutation((tp, fp, gold - tp), (tp_b, fp, gold - tp_b), n_resamples)
+    t_test = time.perf_counter() - start
+
+    print(f"{n_trials} trials, {n_resamples} resamples, {os.cpu_count()} CPUs")
+    print(f"  bootstrap CI:         {t_ci:.2f}s  F1 {ci['F1'][0]:.3f} – {ci['F1'][1]:.3f}")
+    print(f"  paired permutation:   {t_test:.2f}s  ΔF1 {test['F1_difference']:.3f}, p = {test['p_value']:.4f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,170 @@
+"""
+Target-biomarker matcher
+------------------------------------------
+One matcher for "is this term in HER2/BRCA evaluation scope", shared by the
+evaluation scripts, the relevance-gate audit and the oracle mapping.
+
+1. An Aho-Corasick automaton is built over the target vocabulary
+   (TARGET_FAMILIES in common/vocabulary.py) and flattened into a DFA:
+   one dict of next states per state, and a family bitmask per state
+2. A term is scanned once, character by character, instead of once per
+   vocabulary entry; `families()` returns every target family whose
+   vocabulary occurs in the term
+3. Matching is case-insensitive substring matching, exactly like the old
+   `any(key in term.lower() for key in TARGET_BIOMARKERS)`
+4. Results are memoized in a bounded LRU cache (extracted terms repeat a lot)
+
+`python -m common.target_matcher` (from Scripts_and_Prompt/) benchmarks it
+against the substring loop on a synthetic million-term input.
+"""
+
+from collections import deque
+from functools import lru_cache
+
+from common.vocabulary import TARGET_FAMILIES
+
+
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+
+### ============================================================
+###  PART 1 — AUTOMATON
+### ============================================================
+
+class TargetMatcher:
+    """Aho-Corasick matcher over {family: [substrings]}."""
+
+    def __init__(self, families, cache_size=DEFAULT_CACHE_SIZE):
+        self.family_names = list(families)
+        self.patterns = []
+
+        goto, fail, out = [{}], [0], [0]
+        for bit, family in enumerate(self.family_names):
+            for term in families[family]:
+                term = term.lower()
+                self.patterns.append(term)
+                state = 0
+                for ch in term:
+                    if ch not in goto[state]:
+                        goto.append({})
+                        fail.append(0)
+                        out.append(0)
+                        goto[state][ch] = len(goto) - 1
+                    state = goto[state][ch]
+                out[state] |= 1 << bit
+
+        # failure links (BFS), outputs inherited along them, then full DFA
+        # transitions so the scan never walks failure links
+        alphabet = {ch for t in self.patterns for ch in t}
+        delta = [dict(g) for g in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            out[state] |= out[fail[state]]
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                    queue.append(nxt)
+                else:
+                    target = delta[fail[state]].get(ch, 0)
+                    if target:
+                        delta[state][ch] = target
+
+        self.delta = delta
+        self.out = out
+        self.n_states = len(goto)
+        self._mask = lru_cache(maxsize=cache_size)(self._scan)
+
+    def _scan(self, term):
+        delta, out = self.delta, self.out
+        state = mask = 0
+        for ch in term.lower():
+            state = delta[state].get(ch, 0)
+            mask |= out[state]
+        return mask
+
+    def mask(self, term):
+        """Bitmask of matched families (bit i = self.family_names[i])."""
+        return self._mask(term)
+
+    def families(self, term):
+        """Names of the target families occurring in `term`, in vocabulary order."""
+        mask = self._mask(term)
+        return [name for bit, name in enumerate(self.family_names) if mask >> bit & 1]
+
+    def is_target(self, term):
+        return self._mask(term) != 0
+
+    def cache_info(self):
+        return self._mask.cache_info()
+
+
+TARGET_MATCHER = TargetMatcher(TARGET_FAMILIES)
+
+
+def is_target(term):
+    """Only evaluate BRCA / HER2 / ERBB2."""
+    return TARGET_MATCHER.is_target(term)
+
+
+def target_families(term):
+    return TARGET_MATCHER.families(term)
+
+
+
+### ============================================================
+###  PART 2 — BENCHMARK
+### ============================================================
+
+def synthetic_terms(n, distinct=50000, seed=0):
+    """`n` extracted-term-like strings, a bit over half of them in scope."""
+    import random
+
+    rng = random.Random(seed)
+    words = ["EGFR", "KRAS", "PD-L1", "ALK", "ROS1", "MSI-high", "TMB", "mutation", "positive",
+             "negative", "amplification", "expression", "exon 19 deletion", "status", "IHC 2+",
+             "HER2", "BRCA1", "gBRCA2", "ERBB2", "her2-positive", "BRCA", "anti-HER2"]
+    variants = [
+        " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) + f" {i % 13}"
+        for i in range(distinct)
+    ]
+    return [rng.choice(variants) for _ in range(n)]
+
+
+def benchmark(n=1_000_000):
+    import time
+    from common.vocabulary import TARGET_BIOMARKERS
+
+    terms = synthetic_terms(n)
+
+    def loop_is_target(term):
+        t = term.lower()
+        return any(key in t for key in TARGET_BIOMARKERS)
+
+    cold = TargetMatcher(TARGET_FAMILIES, cache_size=0)
+    warm = TargetMatcher(TARGET_FAMILIES)
+
+    start = time.perf_counter()
+    old = [loop_is_target(t) for t in terms]
+    t_old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncached = [cold.is_target(t) for t in terms]
+    t_uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = [warm.is_target(t) for t in terms]
+    t_new = time.perf_counter() - start
+
+    assert old == uncached == new, "automaton disagrees with the substring loop"
+    print(f"{n} terms, {len(set(terms))} distinct, {sum(new)} in scope; "
+          f"{len(TARGET_BIOMARKERS)} patterns, {warm.n_states} automaton states")
+    print(f"  substring loop:        {t_old:.2f}s")
+    print(f"  automaton, no cache:   {t_uncached:.2f}s ({t_old / t_uncached:.1f}x)")
+    print(f"  automaton + memoized:  {t_new:.2f}s ({t_old / t_new:.1f}x), {warm.cache_info()}")
+
+
+if __name__ == "__main__":
+    benchmark()
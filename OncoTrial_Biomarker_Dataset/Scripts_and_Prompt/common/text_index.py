@@ -0,0 +1,379 @@
+"""
+Trial full-text index
+------------------------------------------
+On-disk positional inverted index over trial documents, for questions like
+"which trials mention HER2 exon 20 insertions or gBRCA in the exclusion
+criteria?" without re-running the LLM or grepping JSON.
+
+1. Documents are tokenized into casefolded `\\w+` runs; every (term, trial)
+   posting stores the token positions, so phrases are matched exactly
+2. Each trial also stores where its "Inclusion Criteria" / "Exclusion
+   Criteria" sections start, so hits can be restricted to one section
+3. Ranking is BM25 (k1=1.2, b=0.75); every quoted phrase or bare word of
+   the query is one clause, a trailing `*` expands a word by prefix:
+       "exon 20 insertion*" gbrca*
+4. Stored in a single SQLite file; `add_many()` is incremental - trials
+   whose document hash is unchanged are skipped, changed trials are
+   re-indexed, and `remove()` drops trials no longer in the dataset
+5. `terms_where()` / `matches()` are the primitives the extraction relevance
+   gate (LLM_extraction/relevance_gate.py) uses to find candidate trials
+
+Build / update, then search (from Scripts_and_Prompt/):
+
+    python -m common.text_index add trials_index.sqlite random_trials.json --prune
+    python -m common.text_index search trials_index.sqlite '"exon 20 insertion*" gbrca*' --section exclusion
+"""
+
+import argparse
+import hashlib
+import heapq
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from common.json_stream import iter_trials
+
+
+K1 = 1.2
+B = 0.75
+DEFAULT_TOP_K = 10
+IN_CHUNK = 500
+
+TOKEN = re.compile(r"\w+")
+QUERY_CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+QUERY_TOKEN = re.compile(r"\w+\*?")
+
+SECTIONS = ("summary", "inclusion", "exclusion")
+SECTION_HEADERS = {("inclusion", "criteria"): "inclusion", ("exclusion", "criteria"): "exclusion"}
+
+
+def tokenize(text):
+    return TOKEN.findall((text or "").casefold())
+
+
+def document_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def section_starts(tokens):
+    """[(section, first token position)], starting with the summary at 0."""
+    starts = [("summary", 0)]
+    for i in range(len(tokens) - 1):
+        name = SECTION_HEADERS.get((tokens[i], tokens[i + 1]))
+        if name is not None:
+            starts.append((name, i))
+    return starts
+
+
+def parse_query(query):
+    """One list of words per clause; quoted text and hyphenated words are phrases."""
+    clauses = []
+    for phrase, word in QUERY_CLAUSE.findall(query):
+        words = QUERY_TOKEN.findall((phrase or word).casefold())
+        if words:
+            clauses.append(words)
+    return clauses
+
+
+
+### ============================================================
+###  PART 1 — INDEX
+### ============================================================
+
+class TextIndex:
+    """SQLite-backed positional index of {nct_id: document}."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc_id INTEGER PRIMARY KEY,"
+            " nct_id TEXT UNIQUE NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " sections TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS terms ("
+            " term_id INTEGER PRIMARY KEY,"
+            " term TEXT UNIQUE NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term_id INTEGER NOT NULL,"
+            " doc_id INTEGER NOT NULL,"
+            " positions BLOB NOT NULL,"
+            " PRIMARY KEY (term_id, doc_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);"
+        )
+        self.conn.commit()
+        self._term_ids = None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def __contains__(self, nct_id):
+        return self._doc(nct_id) is not None
+
+    def _doc(self, nct_id):
+        return self.conn.execute(
+            "SELECT doc_id, hash FROM docs WHERE nct_id = ?", (nct_id,)
+        ).fetchone()
+
+    def is_current(self, nct_id, text):
+        """True if `nct_id` is indexed with exactly this document."""
+        row = self._doc(nct_id)
+        return row is not None and row[1] == document_hash(text)
+
+    # ---------- writing ----------
+
+    def _terms(self):
+        """{term: term_id}, loaded once and kept current by add()."""
+        if self._term_ids is None:
+            self._term_ids = dict(self.conn.execute("SELECT term, term_id FROM terms"))
+        return self._term_ids
+
+    def _term_id(self, term):
+        term_id = self._terms().get(term)
+        if term_id is None:
+            term_id = self.conn.execute("INSERT INTO terms (term) VALUES (?)", (term,)).lastrowid
+            self._term_ids[term] = term_id
+        return term_id
+
+    def _delete(self, doc_id):
+        self.conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+
+    def add(self, nct_id, text):
+        """Index one trial; returns "added", "updated" or "unchanged" (not committed)."""
+        digest = document_hash(text)
+        row = self._doc(nct_id)
+        if row is not None:
+            if row[1] == digest:
+                return "unchanged"
+            self._delete(row[0])
+
+        tokens = tokenize(text)
+        positions = defaultdict(list)
+        for i, token in enumerate(tokens):
+            positions[token].append(i)
+
+        sections = ";".join(f"{name}:{start}" for name, start in section_starts(tokens))
+        doc_id = self.conn.execute(
+            "INSERT INTO docs (nct_id, hash, length, sections) VALUES (?, ?, ?, ?)",
+            (nct_id, digest, len(tokens), sections)
+        ).lastrowid
+        self.conn.executemany(
+            "INSERT INTO postings (term_id, doc_id, positions) VALUES (?, ?, ?)",
+            [(self._term_id(term), doc_id, np.array(pos, dtype=np.int32).tobytes())
+             for term, pos in positions.items()]
+        )
+        return "added" if row is None else "updated"
+
+    def add_many(self, pairs):
+        """Index (nct_id, document) pairs in one transaction; returns outcome counts."""
+        counts = {"added": 0, "updated": 0, "unchanged": 0}
+        try:
+            with self.conn:
+                for nct_id, text in pairs:
+                    counts[self.add(nct_id, text)] += 1
+        except BaseException:
+            # term IDs handed out in the rolled-back transaction are gone
+            self._term_ids = None
+            raise
+        return counts
+
+    def remove(self, nct_ids):
+        """Drop the given trials; returns how many were indexed."""
+        n = 0
+        with self.conn:
+            for nct_id in nct_ids:
+                row = self._doc(nct_id)
+                if row is not None:
+                    self._delete(row[0])
+                    n += 1
+        return n
+
+    def nct_ids(self):
+        return [r[0] for r in self.conn.execute("SELECT nct_id FROM docs ORDER BY doc_id")]
+
+    # ---------- matching ----------
+
+    def expand(self, word):
+        """Term IDs for one query word; a trailing `*` matches by prefix."""
+        if word.endswith("*"):
+            prefix = word[:-1]
+            rows = self.conn.execute(
+                "SELECT term_id FROM terms WHERE term >= ? AND term < ?",
+                (prefix, prefix + "\U0010ffff")
+            )
+        else:
+            rows = self.conn.execute("SELECT term_id FROM terms WHERE term = ?", (word,))
+        return [r[0] for r in rows]
+
+    def terms_where(self, predicate):
+        """Term IDs of every indexed term for which `predicate(term)` holds."""
+        return [term_id for term, term_id in self._terms().items() if predicate(term)]
+
+    def _select_in(self, sql, ids):
+        """Rows of `sql` (ending in "IN") for every id, in chunks below SQLite's variable limit."""
+        ids = list(ids)
+        for start in range(0, len(ids), IN_CHUNK):
+            chunk = ids[start:start + IN_CHUNK]
+            yield from self.conn.execute(f"{sql} ({','.join('?' * len(chunk))})", chunk)
+
+    def _postings(self, term_ids):
+        """{doc_id: sorted positions} for the union of `term_ids`."""
+        merged = defaultdict(list)
+        for doc_id, blob in self._select_in("SELECT doc_id, positions FROM postings WHERE term_id IN", term_ids):
+            merged[doc_id].append(np.frombuffer(blob, dtype=np.int32))
+        return {d: p[0] if len(p) == 1 else np.unique(np.concatenate(p)) for d, p in merged.items()}
+
+    def _section_ranges(self, doc_ids, section):
+        """{doc_id: [(start, end)]} token ranges of `section`."""
+        ranges = {}
+        for doc_id, length, sections in self._select_in(
+                "SELECT doc_id, length, sections FROM docs WHERE doc_id IN", doc_ids):
+            starts = [(name, int(pos)) for name, pos in (s.split(":") for s in sections.split(";"))]
+            ends = [pos for _, pos in starts[1:]] + [length]
+            ranges[doc_id] = [(pos, end) for (name, pos), end in zip(starts, ends) if name == section]
+        return ranges
+
+    def _match(self, slots, section=None):
+        """
+        {doc_id: number of matches} for a phrase given as one list of term IDs
+        per position (a single slot is a plain term).
+        """
+        if not slots or not all(slots):
+            return {}
+        # documents containing every slot, then positions aligned slot by slot
+        postings = [self._postings(ids) for ids in slots]
+        docs = set(min(postings, key=len))
+        for p in postings:
+            docs &= p.keys()
+
+        hits = {}
+        for doc_id in docs:
+            starts = postings[0][doc_id]
+            for offset, p in enumerate(postings[1:], 1):
+                starts = starts[np.isin(starts + offset, p[doc_id])]
+                if not len(starts):
+                    break
+            if len(starts):
+                hits[doc_id] = starts
+
+        if section is not None and hits:
+            ranges = self._section_ranges(hits.keys(), section)
+            for doc_id in list(hits):
+                starts = hits[doc_id]
+                keep = np.zeros(len(starts), dtype=bool)
+                for lo, hi in ranges.get(doc_id, ()):
+                    keep |= (starts >= lo) & (starts < hi)
+                if keep.any():
+                    hits[doc_id] = starts[keep]
+                else:
+                    del hits[doc_id]
+
+        return {doc_id: len(starts) for doc_id, starts in hits.items()}
+
+    def _nct_ids(self, doc_ids):
+        return dict(self._select_in("SELECT doc_id, nct_id FROM docs WHERE doc_id IN", doc_ids))
+
+    def matches(self, slots, section=None):
+        """{nct_id: number of matches} for a phrase of term-ID slots."""
+        hits = self._match(slots, section)
+        names = self._nct_ids(hits)
+        return {names[d]: n for d, n in hits.items()}
+
+    # ---------- ranking ----------
+
+    def search(self, query, k=DEFAULT_TOP_K, section=None):
+        """Top-`k` [(nct_id, BM25 score)] for `query` (see parse_query())."""
+        n_docs, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        if not n_docs:
+            return []
+        avgdl = total / n_docs
+
+        clause_hits = [self._match([self.expand(w) for w in words], section)
+                       for words in parse_query(query)]
+        candidates = set().union(*clause_hits)
+        if not candidates:
+            return []
+        lengths = dict(self._select_in("SELECT doc_id, length FROM docs WHERE doc_id IN", candidates))
+
+        scores = defaultdict(float)
+        for hits in clause_hits:
+            df = len(hits)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in hits.items():
+                norm = K1 * (1 - B + B * lengths[doc_id] / avgdl)
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+        names = self._nct_ids(d for d, _ in top)
+        return [(names[d], score) for d, score in top]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+
+### ============================================================
+###  PART 2 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index over trial documents")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="index new / changed trials of a trial file")
+    add.add_argument("index")
+    add.add_argument("input", help="trials as JSON / JSONL with a \"document\" field")
+    add.add_argument("--prune", action="store_true",
+                     help="drop indexed trials that are not in the input")
+
+    search = sub.add_parser("search", help="BM25 search")
+    search.add_argument("index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=DEFAULT_TOP_K)
+    search.add_argument("--section", choices=SECTIONS)
+
+    args = parser.parse_args()
+    index = TextIndex(args.index)
+
+    if args.command == "add":
+        seen = []
+
+        def documents():
+            for nct_id, entry in iter_trials(args.input):
+                seen.append(nct_id)
+                yield nct_id, entry.get("document", "")
+
+        start = time.perf_counter()
+        counts = index.add_many(documents())
+        removed = index.remove(set(index.nct_ids()) - set(seen)) if args.prune else 0
+        print(f"Indexed {args.input} in {time.perf_counter() - start:.2f}s: "
+              f"{counts['added']} added, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged, {removed} removed "
+              f"({len(index)} trials in {args.index})")
+    else:
+        start = time.perf_counter()
+        results = index.search(args.query, k=args.k, section=args.section)
+        elapsed = (time.perf_counter() - start) * 1000
+        for nct_id, score in results:
+            print(f"{nct_id}\t{score:.3f}")
+        print(f"{len(results)} trials in {elapsed:.1f} ms")
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
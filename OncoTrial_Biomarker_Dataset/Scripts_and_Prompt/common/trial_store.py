@@ -0,0 +1,285 @@
+"""
+Columnar trial store
+------------------------------------------
+Compact, random-access store for the raw trials, the gold annotations and
+any number of extraction runs, replacing pretty-printed JSON files that
+each repeat the full `document` text.
+
+1. A store is a directory:
+   - documents.bin     every document once, UTF-8, back to back
+   - <column>.bin      one compact JSON value per trial (gold annotations,
+                       one column per extraction run)
+   - index.npz         NCT IDs plus per-column int64 (start, length) arrays;
+                       length -1 means the trial has no value in that column
+2. Opening a store reads only index.npz and builds {nct_id: row}; the .bin
+   files are memory-mapped, so `document()` is a dict lookup plus one slice
+   and `document_view()` returns a zero-copy memoryview into the mapping
+3. `column(name)` is a read-only mapping usable wherever the scripts build
+   `llm_dict = {x["nct_id"]: x ...}` or load the gold-standard dict
+4. Values are written in arrival order (start / length per row), so
+   columns are built from streamed input (common/json_stream.py) with
+   bounded memory; `add_column()` adds a new run to an existing store
+5. Evaluation/llm_only_vs_gs.py reads the gold and run columns from the
+   store when it holds them
+
+Build (from Scripts_and_Prompt/):
+
+    python -m common.trial_store --output trial_store \\
+        --raw random_trials.json --gold random_trials_annotated.json \\
+        --run gpt-4.0-turbo_1shot.json
+"""
+
+import argparse
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from common.json_stream import iter_trials
+
+
+DOCUMENTS = "documents"
+GOLD = "gold"
+INDEX_FILE = "index.npz"
+
+
+
+### ============================================================
+###  PART 1 — WRITING
+### ============================================================
+
+def _write_column(path, pairs, row_of, encode):
+    """Append encoded values to `path`; returns (start, length) arrays over all rows."""
+    starts = np.zeros(len(row_of), dtype=np.int64)
+    lengths = np.full(len(row_of), -1, dtype=np.int64)
+    with open(path, "wb") as f:
+        for nct_id, value in pairs:
+            row = row_of.get(nct_id)
+            if row is None:
+                continue
+            data = encode(value)
+            starts[row] = f.tell()
+            lengths[row] = len(data)
+            f.write(data)
+    return starts, lengths
+
+
+def _encode_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _check_run_name(name):
+    """Run columns share one namespace with the documents and gold columns,
+    which only build() writes."""
+    if not name or name in (DOCUMENTS, GOLD):
+        raise ValueError(f"{name!r} is reserved, not usable as a run column name")
+
+
+def _without(entry, *keys):
+    return {k: v for k, v in entry.items() if k not in keys}
+
+
+
+### ============================================================
+###  PART 2 — STORE
+### ============================================================
+
+class TrialStore:
+    """Read side of a store directory (see module docstring)."""
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(os.path.join(path, INDEX_FILE)) as index:
+            self.ids = index["ids"].tolist()
+            self.columns = [str(c) for c in index["columns"]]
+            self.starts = {c: index[f"{c}__start"] for c in self.columns}
+            self.lengths = {c: index[f"{c}__length"] for c in self.columns}
+        self.row = {nct_id: i for i, nct_id in enumerate(self.ids)}
+        self._maps = {}
+
+    # ---------- build ----------
+
+    @classmethod
+    def build(cls, path, documents, gold=None, runs=None):
+        """
+        Build a store from (nct_id, entry) iterables: `documents` yields raw
+        trials with a "document", `gold` annotated trials, `runs` maps a
+        column name to extraction records. Rows are the raw trials.
+        """
+        runs = runs or {}
+        for name in runs:
+            _check_run_name(name)
+        os.makedirs(path, exist_ok=True)
+
+        # the document pass defines the rows
+        ids, doc_start, doc_length = [], [], []
+        with open(os.path.join(path, f"{DOCUMENTS}.bin"), "wb") as f:
+            for nct_id, entry in documents:
+                data = (entry.get("document") or "").encode("utf-8")
+                ids.append(nct_id)
+                doc_start.append(f.tell())
+                doc_length.append(len(data))
+                f.write(data)
+
+        index = {
+            "ids": np.array(ids),
+            f"{DOCUMENTS}__start": np.array(doc_start, dtype=np.int64),
+            f"{DOCUMENTS}__length": np.array(doc_length, dtype=np.int64),
+        }
+        columns = [DOCUMENTS]
+        row_of = {nct_id: i for i, nct_id in enumerate(ids)}
+
+        extra = {}
+        if gold is not None:
+            extra[GOLD] = ((k, _without(v, "document")) for k, v in gold)
+        for name, records in runs.items():
+            extra[name] = ((k, _without(v, "nct_id")) for k, v in records)
+
+        for name, pairs in extra.items():
+            start, length = _write_column(os.path.join(path, f"{name}.bin"), pairs, row_of, _encode_json)
+            index[f"{name}__start"], index[f"{name}__length"] = start, length
+            columns.append(name)
+
+        index["columns"] = np.array(columns)
+        np.savez(os.path.join(path, INDEX_FILE), **index)
+        return cls(path)
+
+    def add_column(self, name, records):
+        """Add (or replace) a run column from (nct_id, value) pairs; returns the reopened store."""
+        _check_run_name(name)
+        # written aside and swapped in, so open views of this store stay valid
+        blob = os.path.join(self.path, f"{name}.bin")
+        start, length = _write_column(blob + ".tmp",
+                                      ((k, _without(v, "nct_id")) for k, v in records),
+                                      self.row, _encode_json)
+        os.replace(blob + ".tmp", blob)
+        columns = [c for c in self.columns if c != name] + [name]
+        index = {"ids": np.array(self.ids), "columns": np.array(columns)}
+        for c in columns:
+            s, l = (start, length) if c == name else (self.starts[c], self.lengths[c])
+            index[f"{c}__start"], index[f"{c}__length"] = s, l
+
+        tmp = os.path.join(self.path, INDEX_FILE + ".tmp.npz")
+        np.savez(tmp, **index)
+        os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+        return TrialStore(self.path)
+
+    # ---------- access ----------
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, nct_id):
+        return nct_id in self.row
+
+    def _map(self, column):
+        m = self._maps.get(column)
+        if m is None:
+            with open(os.path.join(self.path, f"{column}.bin"), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    m = b""
+                else:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[column] = m
+        return m
+
+    def _span(self, column, nct_id):
+        if column not in self.starts:
+            raise KeyError(f"no column {column!r} (have: {', '.join(self.columns)})")
+        i = self.row.get(nct_id)
+        if i is None or self.lengths[column][i] < 0:
+            return None
+        start = int(self.starts[column][i])
+        return start, start + int(self.lengths[column][i])
+
+    def document_view(self, nct_id):
+        """Zero-copy memoryview of the UTF-8 document bytes, or None."""
+        span = self._span(DOCUMENTS, nct_id)
+        return None if span is None else memoryview(self._map(DOCUMENTS))[span[0]:span[1]]
+
+    def document(self, nct_id, default=None):
+        view = self.document_view(nct_id)
+        return default if view is None else str(view, "utf-8")
+
+    def get(self, column, nct_id, default=None):
+        """Decoded value of `column` for one trial."""
+        if column == DOCUMENTS:
+            return self.document(nct_id, default)
+        span = self._span(column, nct_id)
+        if span is None:
+            return default
+        return json.loads(self._map(column)[span[0]:span[1]])
+
+    def column(self, name):
+        return _ColumnView(self, name)
+
+    def iter_column(self, name):
+        """(nct_id, value) pairs in row order, skipping trials without a value."""
+        for nct_id in self.ids:
+            value = self.get(name, nct_id)
+            if value is not None:
+                yield nct_id, value
+
+    def close(self):
+        """Unmap the blobs; fails while document_view() slices are still alive."""
+        for m in self._maps.values():
+            if isinstance(m, mmap.mmap):
+                m.close()
+        self._maps = {}
+
+
+class _ColumnView(Mapping):
+    """Read-only {nct_id: value} view of one store column."""
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, nct_id):
+        value = self.store.get(self.name, nct_id)
+        if value is None:
+            raise KeyError(nct_id)
+        return value
+
+    def get(self, nct_id, default=None):
+        return self.store.get(self.name, nct_id, default)
+
+    def __iter__(self):
+        return (nct_id for nct_id, _ in self.store.iter_column(self.name))
+
+    def __len__(self):
+        return int(np.sum(self.store.lengths[self.name] >= 0))
+
+
+
+### ============================================================
+###  PART 3 — MAIN
+### ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a columnar trial store")
+    parser.add_argument("--output", required=True, help="store directory")
+    parser.add_argument("--raw", required=True, help="raw trials (JSON / JSONL)")
+    parser.add_argument("--gold", help="gold-standard annotations")
+    parser.add_argument("--run", nargs="*", default=[],
+                        help="extraction outputs; column name = file name without extension")
+    args = parser.parse_args()
+
+    runs = {}
+    for p in args.run:
+        name = os.path.splitext(os.path.basename(p))[0]
+        if name in runs:
+            parser.error(f"two --run files map to the column {name!r}")
+        runs[name] = iter_trials(p)
+    store = TrialStore.build(args.output, iter_trials(args.raw),
+                             gold=iter_trials(args.gold) if args.gold else None, runs=runs)
+
+    size = sum(os.path.getsize(os.path.join(args.output, f)) for f in os.listdir(args.output))
+    print(f"Built {args.output}: {len(store)} trials, columns {', '.join(store.columns)}, "
+          f"{size / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
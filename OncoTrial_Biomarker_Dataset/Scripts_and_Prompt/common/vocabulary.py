@@ -0,0 +1,99 @@
+"""
+HER2/ERBB2 and BRCA1/2 vocabulary shared by extraction, mapping and
+evaluation.
+
+GENE_ALIASES      alias → canonical gene symbol (ontology normalization)
+TARGET_BIOMARKERS substrings that put a term in evaluation scope
+TARGET_FAMILIES   the same substrings grouped by family ("BRCA", "HER2")
+"""
+
+
+GENE_ALIASES = {
+    "her2": "erbb2",
+    "neu": "erbb2",
+    "brca-1": "brca1",
+    "brca-2": "brca2"
+}
+
+
+BRCA_TARGETS = [
+    # ===== BRCA GENERAL =====
+    "brca",
+    "brca1",
+    "brca2",
+    "gbrca",
+    "brca mutation",
+    "pathogenic brca",
+    "germline brca",
+    "somatic brca",
+    "brca-deficient",
+    "brca deficiency",
+    "brca loss",
+    "brca1/2",
+    "brca vus",
+    "variant of uncertain significance",
+
+    # ===== BRCA SPECIFIC MUTATIONS =====
+    "brca1 mutation (germline)",
+    "brca1 mutation (somatic)",
+    "brca2 mutation (germline)",
+    "brca2 mutation (somatic)",
+    "brca1 vus",
+    "brca2 vus",
+    "gbrca1 mutation",
+    "gbrca2 mutation"
+]
+
+
+HER2_TARGETS = [
+    # ===== HER2 / ERBB2 GENERAL =====
+    "her2",
+    "erbb2",
+    "her2+",
+    "her2 positive",
+    "her2 positive expression",
+    "her2-positive",
+    "her2-expressing",
+    "her2 overexpression",
+    "ihc 3+",
+    "her2 ihc",
+    "her2 ihc 1+ or above",
+
+    # ===== HER2 AMPLIFICATION =====
+    "her2 amplification",
+    "erbb2 amplification",
+    "her2 amplification (ngs)",
+    "her2 amplification (ish her2/cep17 ≥ 2.0)",
+
+    # ===== HER2 MUTATIONS =====
+    "her2 mutation",
+    "her2 mutant",
+    "erbb2 mutant",
+    "her2 l755a",
+    "her2 l755s",
+    "her2 v777l",
+    "her2 v659e",
+    "her2 s310f",
+
+    # ===== HER2 EXON 20 INSERTIONS =====
+    "exon 20 insertion",
+    "her2 exon 20 insertion mutation",
+    "her2 exon 20 insertion (insyvma)",
+    "her2 exon 20 insertion (insgsp)",
+    "her2 exon 20 insertion (instgt)",
+    "insyvma",
+    "insgsp",
+    "instgt",
+
+    # ===== HER2 TARGETED =====
+    "her2-targeted",
+    "anti-her2"
+]
+
+
+TARGET_FAMILIES = {
+    "BRCA": BRCA_TARGETS,
+    "HER2": HER2_TARGETS
+}
+
+TARGET_BIOMARKERS = BRCA_TARGETS + HER2_TARGETS